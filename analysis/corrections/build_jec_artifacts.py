@@ -0,0 +1,30 @@
+import argparse
+from analysis.corrections.jerc import JEC_PARAMS, build_jec_artifact, check_jec_artifact
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Convert the JEC/JER text files of each year to a .coffea artifact"
+    )
+    parser.add_argument(
+        "--year",
+        dest="year",
+        type=str,
+        nargs="*",
+        default=list(JEC_PARAMS["jec_tags"]),
+        choices=list(JEC_PARAMS["jec_tags"]),
+        help="years to convert (default: all)",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="rebuild the artifacts even if they are up to date",
+    )
+    args = parser.parse_args()
+
+    for year in args.year:
+        if not args.force and check_jec_artifact(year):
+            print(f"{year}: JEC/JER artifact is up to date")
+            continue
+        artifact_path = build_jec_artifact(year)
+        print(f"{year}: JEC/JER artifact saved to {artifact_path}")
@@ -1,5 +1,6 @@
 import numpy as np
 from coffea.analysis_tools import Weights
+from analysis.utils.profiler import StageProfiler
 from analysis.corrections.muon import MuonWeights
 from analysis.corrections.pileup import add_pileup_weight
 from analysis.corrections.nnlops import add_nnlops_weight
@@ -13,48 +14,57 @@ from analysis.corrections.partonshower import add_partonshower_weight
 from analysis.corrections.electron_ss import apply_electron_ss_corrections
 
 
-def object_corrector_manager(events, year, dataset, workflow_config):
+def object_corrector_manager(events, year, dataset, workflow_config, profiler=None):
     """apply object level corrections"""
     objcorr_config = workflow_config.corrections_config["objects"]
+    # time each correction as a sub-stage of the object corrections
+    profiler = profiler or StageProfiler()
 
     if "jets" in objcorr_config:
-        # apply JEC/JER corrections
-        apply_jec = True
-        apply_jer = False
-        apply_junc = False
-        if hasattr(events, "genWeight"):
-            apply_jer = True
-        apply_jerc_corrections(
-            events,
-            year=year,
-            dataset=dataset,
-            apply_jec=apply_jec,
-            apply_jer=apply_jer,
-            apply_junc=apply_junc,
-        )
+        with profiler.stage("object_corrections/jets", len(events)):
+            # apply JEC/JER corrections
+            apply_jec = True
+            apply_jer = False
+            apply_junc = False
+            if hasattr(events, "genWeight"):
+                apply_jer = True
+            apply_jerc_corrections(
+                events,
+                year=year,
+                dataset=dataset,
+                apply_jec=apply_jec,
+                apply_jer=apply_jer,
+                apply_junc=apply_junc,
+            )
     if "muons" in objcorr_config:
-        # apply muon scale and smearing corrections
-        apply_muon_ss_corrections(
-            events=events,
-            year=year,
-            variation="nominal",
-        )
+        with profiler.stage("object_corrections/muons", len(events)):
+            # apply muon scale and smearing corrections
+            apply_muon_ss_corrections(
+                events=events,
+                year=year,
+                variation="nominal",
+            )
     if "electrons" in objcorr_config:
-        apply_electron_ss_corrections(
-            events=events,
-            year=year,
-            variation="nominal",
-        )
-    if "met" in objcorr_config:
-        # apply MET-phi modulation corrections
-        if year.startswith("2022"):
-            apply_met_phi_corrections(
-                events=events, is_mc=hasattr(events, "genWeight"), year=year
+        with profiler.stage("object_corrections/electrons", len(events)):
+            apply_electron_ss_corrections(
+                events=events,
+                year=year,
+                variation="nominal",
             )
+    if "met" in objcorr_config:
+        with profiler.stage("object_corrections/met", len(events)):
+            # apply MET-phi modulation corrections
+            if year.startswith("2022"):
+                apply_met_phi_corrections(
+                    events=events, is_mc=hasattr(events, "genWeight"), year=year
+                )
 
 
 def weight_manager(pruned_ev, year, dataset, workflow_config, variation="nominal"):
-    """apply event level corrections (weights)"""
+    """
+    apply event level corrections (weights). Up/down variations are only evaluated if
+    'variation' is 'nominal', otherwise (e.g. 'nominal_only') only nominal weights are added
+    """
     # get weights config info
     weights_config = workflow_config.corrections_config["event_weights"]
     # initialize weights container
@@ -68,7 +78,7 @@ def weight_manager(pruned_ev, year, dataset, workflow_config, variation="nominal
             add_pileup_weight(
                 events=pruned_ev,
                 year=year,
-                variation="nominal",
+                variation=variation,
                 weights_container=weights_container,
             )
         if weights_config["partonshowerWeight"]:
@@ -76,17 +86,21 @@ def weight_manager(pruned_ev, year, dataset, workflow_config, variation="nominal
                 add_partonshower_weight(
                     events=pruned_ev,
                     weights_container=weights_container,
+                    variation=variation,
                 )
         if weights_config["lhepdfWeight"]:
             if "LHEPdfWeight" in pruned_ev.fields:
                 add_lhepdf_weight(
                     events=pruned_ev,
                     weights_container=weights_container,
+                    variation=variation,
                 )
         if weights_config["lhescaleWeight"]:
             if "LHEScaleWeight" in pruned_ev.fields:
                 add_scalevar_weight(
-                    events=pruned_ev, weights_container=weights_container
+                    events=pruned_ev,
+                    weights_container=weights_container,
+                    variation=variation,
                 )
 
         if weights_config["nnlopsWeight"]:
@@ -146,3 +160,73 @@ def weight_manager(pruned_ev, year, dataset, workflow_config, variation="nominal
     else:
         weights_container.add("weight", np.ones(len(pruned_ev)))
     return weights_container
+
+
+class ChunkWeights:
+    """
+    Event weights evaluated once per chunk and shared by all categories
+
+    Parameters:
+    -----------
+        weights_container:
+            Weights object filled by 'weight_manager' for the events in 'mask'.
+            None if no event passes 'mask'
+        mask:
+            chunk mask of the events the weights were evaluated for
+    """
+
+    def __init__(self, weights_container, mask):
+        self.weights_container = weights_container
+        self.mask = mask
+        self.variations = (
+            set() if weights_container is None else weights_container.variations
+        )
+        self._weights = {}
+
+    def weight(self, modifier=None):
+        """return chunk-length weights (zero for events outside 'mask')"""
+        if modifier not in self._weights:
+            weights = np.zeros(len(self.mask))
+            if self.weights_container is not None:
+                weights[self.mask] = self.weights_container.weight(modifier)
+            self._weights[modifier] = weights
+        return self._weights[modifier]
+
+    def category_view(self, category_mask):
+        return CategoryWeights(self, category_mask)
+
+
+class CategoryWeights:
+    """
+    Weights of the events of a category, sliced from the chunk weights (which are
+    computed once per chunk). The category events are gathered with integer indices,
+    computed once per category, and each sliced (copied) weight is cached, so every
+    nominal or varied weight is copied at most once per category
+    """
+
+    def __init__(self, chunk_weights, category_mask):
+        self.chunk_weights = chunk_weights
+        self.category_index = np.flatnonzero(category_mask)
+        self.variations = chunk_weights.variations
+        self._weights = {}
+
+    def weight(self, modifier=None):
+        if modifier not in self._weights:
+            self._weights[modifier] = self.chunk_weights.weight(modifier)[
+                self.category_index
+            ]
+        return self._weights[modifier]
+
+
+def chunk_weight_manager(events, mask, year, dataset, workflow_config, variation="nominal"):
+    """evaluate event weights once for the events in 'mask'"""
+    weights_container = None
+    if np.any(mask):
+        weights_container = weight_manager(
+            pruned_ev=events[mask],
+            year=year,
+            dataset=dataset,
+            workflow_config=workflow_config,
+            variation=variation,
+        )
+    return ChunkWeights(weights_container, mask)
@@ -0,0 +1,128 @@
+import os
+import correctionlib
+from collections import OrderedDict
+from analysis.corrections.utils import get_pog_json, get_muon_hlt_json
+
+
+class CorrectionRegistry:
+    """
+    Process-wide cache of parsed correctionlib CorrectionSets. Sets are keyed by
+    (path, modification time), so a correction file is parsed once per process (e.g.
+    once per worker) and re-parsed only if it changes. The least recently used sets
+    are evicted once more than 'maxsize' sets are held
+
+    Parameters:
+    -----------
+        maxsize:
+            maximum number of correction sets kept in memory
+    """
+
+    def __init__(self, maxsize: int = 16):
+        self.maxsize = maxsize
+        self._sets = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, path: str):
+        """return the CorrectionSet of a correctionlib json file"""
+        path = os.path.abspath(str(path))
+        key = (path, os.path.getmtime(path))
+        if key in self._sets:
+            self.hits += 1
+            self._sets.move_to_end(key)
+            return self._sets[key]
+        self.misses += 1
+        cset = correctionlib.CorrectionSet.from_file(path)
+        # a file modified since it was parsed only keeps its latest version
+        for cached_key in [k for k in self._sets if k[0] == path]:
+            del self._sets[cached_key]
+        self._sets[key] = cset
+        while len(self._sets) > self.maxsize:
+            self._sets.popitem(last=False)
+            self.evictions += 1
+        return cset
+
+    def preload(self, paths: list) -> None:
+        """parse the correction sets of 'paths' ahead of time (missing files are skipped)"""
+        for path in paths:
+            if os.path.exists(path):
+                self.get(path)
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "cached": len(self._sets),
+        }
+
+    def clear(self) -> None:
+        self._sets.clear()
+        self.hits = self.misses = self.evictions = 0
+
+
+_REGISTRY = CorrectionRegistry()
+# correction files already preloaded in this process
+_PRELOADED = set()
+
+
+def get_correction_set(path: str):
+    """return the (cached) CorrectionSet of a correctionlib json file"""
+    return _REGISTRY.get(path)
+
+
+def get_correction_stats() -> dict:
+    """return the hit/miss/eviction counters of the correction registry"""
+    return _REGISTRY.stats()
+
+
+def get_correction_paths(year: str, corrections_config: dict, is_mc: bool) -> list:
+    """
+    return the correctionlib json files used by a corrections config
+
+    Parameters:
+    -----------
+        year:
+            dataset year {2022preEE, 2022postEE, 2023preBPix, 2023postBPix}
+        corrections_config:
+            workflow corrections config with 'objects' and 'event_weights'
+        is_mc:
+            whether the dataset is MC
+    """
+    objects_config = corrections_config["objects"]
+    weights_config = corrections_config["event_weights"]
+    data_path = os.path.join(os.getcwd(), "analysis", "data")
+    paths = []
+    if "muons" in objects_config:
+        paths.append(os.path.join(data_path, f"{year}_muonSS.json.gz"))
+    if "electrons" in objects_config:
+        paths.append(os.path.join(data_path, f"{year}_electronSS_EtDependent.json.gz"))
+    if "met" in objects_config and year.startswith("2022"):
+        paths.append(os.path.join(data_path, "met_xy_corrections.json"))
+    if is_mc:
+        if weights_config.get("pileupWeight"):
+            paths.append(get_pog_json(json_name="pileup", year=year))
+        if weights_config.get("muon"):
+            paths.append(get_pog_json(json_name="muon", year=year))
+            if weights_config["muon"].get("trigger"):
+                paths.append(get_muon_hlt_json(year=year))
+        if weights_config.get("electron"):
+            paths.append(get_pog_json(json_name="electron_id", year=year))
+            if weights_config["electron"].get("trigger"):
+                paths.append(get_pog_json(json_name="electron_hlt", year=year))
+    return paths
+
+
+def preload_correction_sets(year: str, corrections_config: dict, is_mc: bool) -> None:
+    """
+    parse the correction sets of a corrections config once per process. Files already
+    preloaded are skipped, so calling it for every chunk does not add registry hits
+    """
+    paths = [
+        path
+        for path in get_correction_paths(year, corrections_config, is_mc)
+        if path not in _PRELOADED
+    ]
+    _REGISTRY.preload(paths)
+    _PRELOADED.update(paths)
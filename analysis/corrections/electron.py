@@ -1,4 +1,4 @@
-import correctionlib
+from analysis.corrections.correction_registry import get_correction_set
 import numpy as np
 import awkward as ak
 from typing import Type
@@ -6,6 +6,7 @@ from coffea.analysis_tools import Weights
 from analysis.selections.trigger import trigger_match_mask
 from analysis.selections.event_selections import get_trigger_mask
 from analysis.corrections.met import update_met
+from analysis.corrections.rng import get_object_normal
 from analysis.corrections.utils import get_pog_json, get_egamma_json, unflat_sf
 
 
@@ -151,7 +152,7 @@ class ElectronWeights:
                 {sf, sfdown, sfup}
         """
         # get electron correction set
-        cset = correctionlib.CorrectionSet.from_file(
+        cset = get_correction_set(
             get_pog_json(json_name="electron_id", year=self.year)
         )
         # get electrons that pass the id wp, and within SF binning
@@ -190,7 +191,7 @@ class ElectronWeights:
                 {sf, sfdown, sfup}
         """
         # get electron correction set
-        cset = correctionlib.CorrectionSet.from_file(
+        cset = get_correction_set(
             get_pog_json(json_name="electron_id", year=self.year)
         )
         # get electrons that pass the id wp, and within SF binning
@@ -240,7 +241,7 @@ class ElectronWeights:
                 {sf, sfdown, sfup}
         """
         # get electron correction set
-        cset = correctionlib.CorrectionSet.from_file(
+        cset = get_correction_set(
             get_pog_json(json_name="electron_hlt", year=self.year)
         )
         # get electrons that pass the id wp, and within SF binning
@@ -259,8 +260,10 @@ class ElectronWeights:
         }
         sf_variations_map = {"nom": "sf", "up": "sfup", "down": "sfdown"}
 
-        kind = "single" if ak.all(ak.num(self.electrons) == 1) else "double"
-        if kind == "single":
+        # the kind of SF (single or double electron) is chosen event by event
+        is_single = self.electrons_counts == 1
+        nominal_sf = ak.ones_like(self.electrons_counts, dtype=np.float64)
+        if ak.any(is_single):
             # for single electorn events, compute SF from POG SF
             sf = cset["Electron-HLT-SF"].evaluate(
                 self.year_map[self.year],
@@ -270,10 +273,10 @@ class ElectronWeights:
                 electron_pt,
             )
             sf = ak.where(in_electrons_mask, sf, ak.ones_like(sf))
-            sf = ak.fill_none(ak.unflatten(sf, self.electrons_counts), value=1)
-            nominal_sf = ak.firsts(nominal_sf)
+            sf = ak.fill_none(ak.firsts(ak.unflatten(sf, self.electrons_counts)), 1)
+            nominal_sf = ak.where(is_single, sf, nominal_sf)
 
-        elif kind == "double":
+        if not ak.all(is_single):
             # for double electron events, compute SF from electrons' efficiencies
             data_eff = cset["Electron-HLT-DataEff"].evaluate(
                 self.year_map[self.year],
@@ -310,7 +313,7 @@ class ElectronWeights:
             full_mc_eff = ak.fill_none(full_mc_eff, 1)
 
             # compute SF from efficiencies
-            nominal_sf = full_data_eff / full_mc_eff
+            nominal_sf = ak.where(is_single, nominal_sf, full_data_eff / full_mc_eff)
 
         return nominal_sf
 
@@ -337,12 +340,12 @@ class ElectronSS:
         self.variation = variation
         if year.startswith("2022"):
             # get correction set from POG
-            self.cset = correctionlib.CorrectionSet.from_file(
+            self.cset = get_correction_set(
                 get_pog_json(json_name="electron_ss", year=self.year)
             )
         if year.startswith("2023"):
             # get correction set from EG POG
-            self.cset = correctionlib.CorrectionSet.from_file(
+            self.cset = get_correction_set(
                 get_egamma_json(year=self.year)
             )
         self.year_mapping = {
@@ -401,7 +404,7 @@ class ElectronSS:
             # uncertainties: TO DO (https://cms-talk.web.cern.ch/t/pnoton-energy-corrections-in-nanoaod-v11/34327/2)
             pass
 
-    def apply_smearing(self, seed=42):
+    def apply_smearing(self):
         # get correction input variables
         etasc = self.flat_electrons.eta + self.flat_electrons.deltaEtaSC
         r9 = self.flat_electrons.r9
@@ -414,8 +417,10 @@ class ElectronSS:
         )
         if self.variation == "nominal":
             # The smearing is done statistically, so we need some random numbers
-            rng = np.random.default_rng(seed=seed)
-            smearing = rng.normal(loc=1.0, scale=rho)
+            # (reproducible, seeded by event and electron index)
+            smearing = 1.0 + rho * get_object_normal(
+                self.events, self.events.Electron, "electron_smearing"
+            )
             # apply smearing correction only to electons with pT > 20 GeV
             corrected_flat_electrons_pt = ak.where(
                 self.flat_electrons.pt > 20,
@@ -1,8 +1,9 @@
-import correctionlib
+from analysis.corrections.correction_registry import get_correction_set
 import numpy as np
 import awkward as ak
 from pathlib import Path
 from analysis.corrections.met import update_met
+from analysis.corrections.rng import get_object_normal
 
 
 def filter_boundaries(pt_corr, pt, nested=True):
@@ -53,7 +54,7 @@ def apply_electron_ss_corrections(
     json_path = (
         Path.cwd() / "analysis" / "data" / f"{year}_electronSS_EtDependent.json.gz"
     )
-    cset = correctionlib.CorrectionSet.from_file(str(json_path))
+    cset = get_correction_set(str(json_path))
     year_map = {
         "2022preEE": "2022preEE",
         "2022postEE": "2022postEE",
@@ -76,8 +77,10 @@ def apply_electron_ss_corrections(
     if variation == "nominal":
         if hasattr(events, "genWeight"):
             smear = smear_evaluator.evaluate("smear", pt, r9, abseta)
-            rng = np.random.default_rng(seed=42)
-            random_numbers = rng.normal(loc=0.0, scale=1.0, size=len(pt))
+            # reproducible random numbers, seeded by event and electron index
+            random_numbers = get_object_normal(
+                events, events.Electron, "electron_smearing"
+            )
             correction_factor = 1 + smear * random_numbers
         else:
             correction_factor = scale_evaluator.evaluate(
@@ -1,11 +1,14 @@
 # tools to apply JEC/JER and compute their uncertainties (https://cms-jerc.web.cern.ch/Recommendations/)
 # copied from https://github.com/green-cabbage/copperheadV2/blob/main/corrections/jet.py
+import json
 import yaml
-import contextlib
+import coffea
+import warnings
 import numpy as np
 import awkward as ak
 import importlib.resources
 from pathlib import Path
+from coffea.util import save, load
 from analysis.filesets.utils import get_dataset_era
 from coffea.lookup_tools import extractor
 from coffea.jetmet_tools import JECStack, CorrectedJetsFactory
@@ -51,7 +54,20 @@ def jec_names_and_sources(year):
     return names
 
 
+# JEC/JER evaluators and jet factories, built once per process (e.g. once per worker)
+_JET_EVALUATORS = {}
+_JEC_FACTORIES = {}
+
+
 def get_jet_evaluator(year):
+    """return the (cached) evaluator with the JEC/JER text files of a year"""
+    if year not in _JET_EVALUATORS:
+        _JET_EVALUATORS[year] = build_jet_evaluator(year)
+    return _JET_EVALUATORS[year]
+
+
+def get_jec_files(year) -> list:
+    """return the JEC/JER text files (MC and data) of a year"""
     names = jec_names_and_sources(year)
     extensions = {
         "jec_names": "jec",
@@ -60,65 +76,100 @@ def get_jet_evaluator(year):
         "junc_names": "junc",
         "junc_sources": "junc",
     }
-    # prepare evaluators for JEC, JER and their systematics
-    jec_ext = extractor()
+    jec_dir = importlib.resources.files("analysis.data.jec")
+    jec_files = []
     for opt, ext in extensions.items():
         # MC
-        with contextlib.ExitStack() as stack:
-            jec_files = [
-                stack.enter_context(
-                    importlib.resources.path("analysis.data.jec", f"{name}.{ext}.txt")
-                )
-                for name in names[opt]
-            ]
-            jec_ext.add_weight_sets([f"* * {file}" for file in jec_files])
+        jec_files += [jec_dir / f"{name}.{ext}.txt" for name in names[opt]]
         # Data
         if "jer" in opt:
             continue
         data = []
         for run, items in names[f"{opt}_data"].items():
             data.extend(items)
-        data = list(set(data))
-        with contextlib.ExitStack() as stack:
-            jec_data_files = [
-                stack.enter_context(
-                    importlib.resources.path("analysis.data.jec", f"{name}.{ext}.txt")
-                )
-                for name in data
-            ]
-            jec_ext.add_weight_sets([f"* * {file}" for file in jec_data_files])
+        jec_files += [jec_dir / f"{name}.{ext}.txt" for name in sorted(set(data))]
+    return [Path(file) for file in jec_files]
+
+
+def get_jec_files_stamp(year) -> dict:
+    """
+    return a stamp of the JEC/JER text files of a year (name, size and modification
+    time of each file) and of the coffea version used to parse them. It only needs
+    the file metadata, so checking an artifact does not read the text files
+    """
+    files = []
+    for file in get_jec_files(year):
+        stat = file.stat()
+        files.append([file.name, stat.st_size, stat.st_mtime_ns])
+    return {"coffea": coffea.__version__, "files": files}
+
+
+def get_jec_artifact_path(year) -> Path:
+    return Path(importlib.resources.files("analysis.data.jec")) / f"{year}_jerc.coffea"
 
+
+def get_jec_stamp_path(year) -> Path:
+    return Path(importlib.resources.files("analysis.data.jec")) / f"{year}_jerc.json"
+
+
+def parse_jec_files(year):
+    """parse the JEC/JER text files of a year and return the finalized extractor"""
+    # prepare evaluators for JEC, JER and their systematics
+    jec_ext = extractor()
+    jec_ext.add_weight_sets([f"* * {file}" for file in get_jec_files(year)])
     jec_ext.finalize()
-    jet_evaluator = jec_ext.make_evaluator()
-    return jet_evaluator
+    return jec_ext
 
 
-def apply_jerc_corrections(
-    events,
-    year,
-    dataset,
-    apply_jec,
-    apply_jer,
-    apply_junc,
-):
-    era = get_dataset_era(dataset, year)
-    # add requiered variables to Jet collection
-    jets = events.Jet
-    if apply_jec:
-        # set raw pT and Mass, otherwise original pT and Mass will be used as 'raw' values
-        events["Jet", "pt_raw"] = (
-            (1 - jets.rawFactor) * jets.pt if apply_jec else jets.pt
-        )
-        events["Jet", "mass_raw"] = (
-            (1 - jets.rawFactor) * jets.mass if apply_jec else jets.mass
-        )
-    if apply_jer:
-        # set ptGenJet (required for hybrid JER smearing method)
-        events["Jet", "pt_gen"] = ak.values_astype(
-            ak.fill_none(jets.matched_gen.pt, 0), np.float32
+def build_jec_artifact(year) -> Path:
+    """
+    parse the JEC/JER text files of a year once and save their evaluator to a
+    compressed .coffea artifact, and the stamp of the text files to a json file
+    next to it
+    """
+    artifact_path = get_jec_artifact_path(year)
+    save(parse_jec_files(year).make_evaluator(), artifact_path)
+    with open(get_jec_stamp_path(year), "w") as f:
+        json.dump(get_jec_files_stamp(year), f)
+    return artifact_path
+
+
+def check_jec_artifact(year) -> bool:
+    """return True if the JEC/JER artifact of a year exists and is up to date"""
+    stamp_path = get_jec_stamp_path(year)
+    if not (get_jec_artifact_path(year).exists() and stamp_path.exists()):
+        return False
+    with open(stamp_path) as f:
+        return json.load(f) == get_jec_files_stamp(year)
+
+
+def build_jet_evaluator(year):
+    """
+    load the JEC/JER evaluator of a year from its .coffea artifact, or build it from
+    the text files if the artifact is missing or stale (text files or coffea version
+    changed)
+    """
+    artifact_path = get_jec_artifact_path(year)
+    if check_jec_artifact(year):
+        return load(artifact_path)
+    if artifact_path.exists():
+        warnings.warn(
+            f"JEC/JER artifact {artifact_path} is stale, parsing text files instead."
+            " Run 'python3 -m analysis.corrections.build_jec_artifacts' to update it"
         )
-    events["Jet", "rho"] = ak.ones_like(jets.pt) * events.Rho.fixedGridRhoFastjetAll
+    return parse_jec_files(year).make_evaluator()
 
+
+def get_jec_factory(year, era, apply_jec, apply_jer, apply_junc):
+    """return the (cached) CorrectedJetsFactory of a dataset year and era"""
+    key = (year, era, apply_jec, apply_jer, apply_junc)
+    if key not in _JEC_FACTORIES:
+        _JEC_FACTORIES[key] = build_jec_factory(*key)
+    return _JEC_FACTORIES[key]
+
+
+def build_jec_factory(year, era, apply_jec, apply_jer, apply_junc):
+    """build the CorrectedJetsFactory with the JEC/JER stack of a dataset year and era"""
     # set inputs for jec, jer and junc stack
     names = jec_names_and_sources(year)
     jet_evaluator = get_jet_evaluator(year)
@@ -190,5 +241,37 @@ def apply_jerc_corrections(
         jec_stack_data = JECStack(jec_inputs_data)
         jec_factory = CorrectedJetsFactory(jec_name_map, jec_stack_data)
 
+    return jec_factory
+
+
+def apply_jerc_corrections(
+    events,
+    year,
+    dataset,
+    apply_jec,
+    apply_jer,
+    apply_junc,
+):
+    era = get_dataset_era(dataset, year)
+    # add requiered variables to Jet collection
+    jets = events.Jet
+    if apply_jec:
+        # set raw pT and Mass, otherwise original pT and Mass will be used as 'raw' values
+        events["Jet", "pt_raw"] = (
+            (1 - jets.rawFactor) * jets.pt if apply_jec else jets.pt
+        )
+        events["Jet", "mass_raw"] = (
+            (1 - jets.rawFactor) * jets.mass if apply_jec else jets.mass
+        )
+    if apply_jer:
+        # set ptGenJet (required for hybrid JER smearing method)
+        events["Jet", "pt_gen"] = ak.values_astype(
+            ak.fill_none(jets.matched_gen.pt, 0), np.float32
+        )
+    events["Jet", "rho"] = ak.ones_like(jets.pt) * events.Rho.fixedGridRhoFastjetAll
+
+    # the factory of each (year, era, jec/jer/junc options) is built once per process
+    jec_factory = get_jec_factory(year, era, apply_jec, apply_jer, apply_junc)
+
     # update Jet collection
     events["Jet"] = jec_factory.build(events.Jet, events.caches[0])
\ No newline at end of file
@@ -1,4 +1,4 @@
-import correctionlib
+from analysis.corrections.correction_registry import get_correction_set
 import numpy as np
 import awkward as ak
 from analysis.corrections.utils import get_pog_json
@@ -20,7 +20,7 @@ def jetvetomaps_mask(jets: ak.Array, year: str, mapname: str = "jetvetomap"):
         "2023preBPix": "Summer23Prompt23_RunC_V1",
         "2023postBPix": "Summer23BPixPrompt23_RunD_V1"
     }
-    cset = correctionlib.CorrectionSet.from_file(get_pog_json("jetvetomaps", year))
+    cset = get_correction_set(get_pog_json("jetvetomaps", year))
 
     j, n = ak.flatten(jets), ak.num(jets)
     jet_eta_mask = np.abs(j.eta) < 5.19
@@ -1,3 +1,4 @@
+import warnings
 import numpy as np
 
 def add_scalevar_weight(events, weights_container, variation="nominal"):
@@ -48,4 +49,10 @@ def add_scalevar_weight(events, weights_container, variation="nominal"):
             weights_container.add("scalevar_muR_muF", nom, nom, nom)
 
     else:
-        weights_container.add("scalevar_3pt", nom)
\ No newline at end of file
+        # same nominal weights as above, without the up/down variations
+        if len(lhe_weights) > 0 and len(lhe_weights[0]) == 9:
+            nom = lhe_weights[:, 4]
+            for name in ["scalevar_muR", "scalevar_muF", "scalevar_muR_muF"]:
+                weights_container.add(name, nom)
+        else:
+            weights_container.add("scalevar_3pt", nom)
\ No newline at end of file
@@ -1,6 +1,7 @@
-import correctionlib
+from analysis.corrections.correction_registry import get_correction_set
 import numpy as np
 import awkward as ak
+from analysis.corrections.rng import get_event_integers
 
 
 def apply_met_phi_corrections(
@@ -28,7 +29,7 @@ def apply_met_phi_corrections(
     Docs: (from https://twiki.cern.ch/twiki/bin/viewauth/CMS/MissingETRun2Corrections#xy_Shift_Correction_MET_phi_modu)
         The xy-Shift correction reduces the MET phi modulation. The distribution of true MET is independent of phi because of the rotational symmetry of the collisions around the beam axis. However, we observe that the reconstructed MET does depend on phi. The MET phi distribution has roughly a sinusoidal curve with the period of 2pi. The possible causes of the modulation include anisotropic detector responses, inactive calorimeter cells or tracking regions, the detector misalignment, the displacement of the beam spot. The amplitude of the modulation increases roughly linearly with the number of the pile-up interactions. We can reduce the amplitude of the phi modulation by shifting the origin of the coordinate in the transverse momentum plane as a function of different particle species and in bins of eta.
     """
-    cset = correctionlib.CorrectionSet.from_file(
+    cset = get_correction_set(
         "analysis/data/met_xy_corrections.json"
     )
     events["PuppiMET", "pt_raw"] = ak.ones_like(events.PuppiMET.pt) * events.PuppiMET.pt
@@ -49,8 +50,9 @@ def apply_met_phi_corrections(
     }
     data_kind = "mc" if is_mc else "data"
     if data_kind == "mc":
-        run = np.random.randint(
-            run_ranges[year][0], run_ranges[year][1], size=len(met_pt)
+        # reproducible run numbers, seeded by event
+        run = get_event_integers(
+            events, run_ranges[year][0], run_ranges[year][1], "met_run"
         )
     else:
         run = events.run
@@ -1,5 +1,5 @@
 import json
-import correctionlib
+from analysis.corrections.correction_registry import get_correction_set
 import numpy as np
 import awkward as ak
 from typing import Type
@@ -50,7 +50,7 @@ class MuonWeights:
         self.muons_counts = ak.num(self.muons)
 
         # get muon correction set
-        self.cset = correctionlib.CorrectionSet.from_file(
+        self.cset = get_correction_set(
             get_pog_json(json_name="muon", year=year)
         )
 
@@ -222,31 +222,15 @@ class MuonWeights:
 
     def get_hlt_weights(self, id_wp, iso_wp, variation):
         """
-        Compute muon HLT weights
+        Compute muon HLT weights. The kind of SF (single or double muon) is chosen
+        event by event from the number of muons, so the weights do not depend on
+        which other events are in the array
 
         Parameters:
         -----------
             variation:
                 {nominal, systup, systdown}
         """
-        muon_pt_mask = self.flat_muons.pt > 26.0
-
-        kind = "single" if ak.all(ak.num(self.muons) == 1) else "double"
-        if kind == "double":
-            upper_limit = 199.99
-            if self.year == "2022preEE":
-                upper_limit = 499.99
-            muon_pt_mask = muon_pt_mask & (self.flat_muons.pt < upper_limit)
-
-        muon_eta_mask = np.abs(self.flat_muons.eta) < 2.4
-
-        # get muons passing ID and Iso wps, trigger, and within SF binning
-        in_muons_mask = muon_pt_mask & muon_eta_mask
-        in_muons = self.flat_muons.mask[in_muons_mask]
-
-        # get muons pT and abseta (replace None values with some 'in-limit' value)
-        muon_pt = ak.fill_none(in_muons.pt, 26)
-        muon_eta = ak.fill_none(np.abs(in_muons.eta), 0)
         hlt_path_id_map = {
             ("tight", "tight"): "NUM_IsoMu24_DEN_CutBasedIdTight_and_PFIsoTight",
             # ("medium", "medium"): "NUM_IsoMu24_DEN_CutBasedIdMedium_and_PFIsoMedium",
@@ -257,15 +241,38 @@ class MuonWeights:
         ) in hlt_path_id_map, (
             f"There's no HLT correction for (ID, ISO) wps pair {(id_wp, iso_wp)}"
         )
-        if kind == "single":
+        is_single = self.muons_counts == 1
+        nominal_sf = ak.ones_like(self.muons_counts, dtype=np.float64)
+        muon_eta_mask = np.abs(self.flat_muons.eta) < 2.4
+
+        if ak.any(is_single):
             # for single muon events, compute SF from POG SF
+            in_muons_mask = (self.flat_muons.pt > 26.0) & muon_eta_mask
+            in_muons = self.flat_muons.mask[in_muons_mask]
+            # get muons pT and abseta (replace None values with some 'in-limit' value)
+            muon_pt = ak.fill_none(in_muons.pt, 26)
+            muon_eta = ak.fill_none(np.abs(in_muons.eta), 0)
             sf = self.cset[hlt_path_id_map[(id_wp, iso_wp)]].evaluate(
                 muon_eta, muon_pt, variation
             )
-            nominal_sf = unflat_sf(sf, in_muons_mask, self.muons_counts)
-        elif kind == "double":
+            single_sf = unflat_sf(sf, in_muons_mask, self.muons_counts)
+            nominal_sf = ak.where(is_single, single_sf, nominal_sf)
+
+        if not ak.all(is_single):
             # for double muon events, compute SF from data/mc muon hlt efficiencies
-            double_cset = correctionlib.CorrectionSet.from_file(
+            upper_limit = 199.99
+            if self.year == "2022preEE":
+                upper_limit = 499.99
+            in_muons_mask = (
+                (self.flat_muons.pt > 26.0)
+                & (self.flat_muons.pt < upper_limit)
+                & muon_eta_mask
+            )
+            in_muons = self.flat_muons.mask[in_muons_mask]
+            # get muons pT and abseta (replace None values with some 'in-limit' value)
+            muon_pt = ak.fill_none(in_muons.pt, 26)
+            muon_eta = ak.fill_none(np.abs(in_muons.eta), 0)
+            double_cset = get_correction_set(
                 get_muon_hlt_json(year=self.year)
             )
             data_eff = double_cset["Muon-HLT-DataEff"].evaluate(
@@ -294,6 +301,6 @@ class MuonWeights:
             )
             full_mc_eff = ak.fill_none(full_mc_eff, 1)
 
-            nominal_sf = full_data_eff / full_mc_eff
+            nominal_sf = ak.where(is_single, nominal_sf, full_data_eff / full_mc_eff)
 
         return nominal_sf
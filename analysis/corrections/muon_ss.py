@@ -1,190 +1,135 @@
 # taken from: https://gitlab.cern.ch/cms-muonPOG/muonscarekit/-/blob/master/scripts/MuonScaRe.py?ref_type=heads
+import math
+import numba
 import numpy as np
 import awkward as ak
-import correctionlib
+from analysis.corrections.correction_registry import get_correction_set
 from pathlib import Path
-from random import random
-from scipy.special import erfinv, erf
 from analysis.corrections.met import update_met
+from analysis.corrections.rng import get_object_uniform
 
 
-class CrystallBall:
-
-    def __init__(self, m, s, a, n):
-        self.pi = 3.14159
-        self.sqrtPiOver2 = np.sqrt(self.pi / 2.0)
-        self.sqrt2 = np.sqrt(2.0)
-        self.m = ak.Array(m)
-        self.s = ak.Array(s)
-        self.a = ak.Array(a)
-        self.n = ak.Array(n)
-        self.fa = abs(self.a)
-        self.ex = np.exp(-self.fa * self.fa / 2)
-        self.A = (self.n / self.fa) ** self.n * self.ex
-        self.C1 = self.n / self.fa / (self.n - 1) * self.ex
-        self.D1 = 2 * self.sqrtPiOver2 * erf(self.fa / self.sqrt2)
-
-        self.B = self.n / self.fa - self.fa
-        self.C = (self.D1 + 2 * self.C1) / self.C1
-        self.D = (self.D1 + 2 * self.C1) / 2
-
-        self.N = 1.0 / self.s / (self.D1 + 2 * self.C1)
-        self.k = 1.0 / (self.n - 1)
-
-        self.NA = self.N * self.A
-        self.Ns = self.N * self.s
-        self.NC = self.Ns * self.C1
-        self.F = 1 - self.fa * self.fa / self.n
-        self.G = self.s * self.n / self.fa
-        self.cdfMa = self.cdf(self.m - self.a * self.s)
-        self.cdfPa = self.cdf(self.m + self.a * self.s)
-
-    def cdf(self, x):
-        x = ak.Array(x)
-        d = (x - self.m) / self.s
-        result = ak.full_like(d, 1.0)
-
-        # define different conditions
-        c1a = (d < -self.a) & (self.F - self.s * d / self.G > 0)
-        c1b = (d < -self.a) & (self.F - self.s * d / self.G <= 0)
-        c2a = (d > self.a) & (self.F + self.s * d / self.G > 0)
-        c2b = (d > self.a) & (self.F + self.s * d / self.G <= 0)
-
-        c3 = ~c1a & ~c1b & ~c2a & ~c2b
-        # For d < -a
-        result = ak.where(
-            c1a, self.NC / np.power(self.F - self.s * d / self.G, self.n - 1), result
-        )
-        result = ak.where(c1b, self.NC, result)
-
-        # For d > a
-        result = ak.where(
-            c2a,
-            self.NC * (self.C - np.power(self.F + self.s * d / self.G, 1 - self.n)),
-            result,
-        )
-        result = ak.where(c2b, self.NC * self.C, result)
-
-        # For -a <= d <= a
-        result = ak.where(
-            c3, self.Ns * (self.D - self.sqrtPiOver2 * erf(-d / self.sqrt2)), result
-        )
-
-        return result
-
-    def invcdf(self, u):
-        u = ak.Array(u)
-        result = ak.zeros_like(u)
-
-        c1a = (u < self.cdfMa) & (self.NC / u > 0)
-        c1b = (u < self.cdfMa) & (self.NC / u <= 0)
-        c2a = (u > self.cdfPa) & (self.C - u / self.NC > 0)
-        c2b = (u > self.cdfPa) & (self.C - u / self.NC <= 0)
-        c3 = ~c1a & ~c1b & ~c2a & ~c2b
-
-        # For u < cdfMa
-        result = ak.where(
-            c1a, self.m + self.G * (self.F - (self.NC / u) ** self.k), result
-        )
-        result = ak.where(c1b, self.m + self.G * self.F, result)
-
-        # For u > cdfPa
-        result = ak.where(
-            c2a,
-            self.m - self.G * (self.F - (self.C - u / self.NC) ** (-self.k)),
-            result,
-        )
-        result = ak.where(c2b, self.m - self.G * self.F, result)
-
-        # For cdfMa <= u <= cdfPa
-        result = ak.where(
-            c3,
-            self.m
-            - self.sqrt2 * self.s * erfinv((self.D - u / self.Ns) / self.sqrtPiOver2),
-            result,
-        )
-
-        return result
-
-
-def get_rndm(eta, nL, cset, nested=False):
-    # obtain parameters from correctionlib
-    if nested:
-        eta_f, nL_f, nmuons = ak.flatten(eta), ak.flatten(nL), ak.num(nL)
-    else:
-        eta_f, nL_f, nmuons = eta, nL, np.ones_like(eta)
-
-    mean_f = cset.get("cb_params").evaluate(abs(eta_f), nL_f, 0)
-    sigma_f = cset.get("cb_params").evaluate(abs(eta_f), nL_f, 1)
-    n_f = cset.get("cb_params").evaluate(abs(eta_f), nL_f, 2)
-    alpha_f = cset.get("cb_params").evaluate(abs(eta_f), nL_f, 3)
-
-    # get random number following the CB
-    # print(nmuons)
-    rndm_f = [random() for i in nmuons for j in range(int(i))]
-
-    cb_f = CrystallBall(mean_f, sigma_f, alpha_f, n_f)
-
-    result_f = cb_f.invcdf(rndm_f)
-
-    if nested:
-        result = ak.unflatten(result_f, nmuons)
-    else:
-        result = result_f
-
-    return result
-
-
-def get_std(pt, eta, nL, cset, nested=False):
-    if nested:
-        eta_f, nL_f, pt_f, nmuons = (
-            ak.flatten(eta),
-            ak.flatten(nL),
-            ak.flatten(pt),
-            ak.num(nL),
-        )
-    else:
-        eta_f, nL_f, pt_f, nmuons = eta, nL, pt, 1
-
-    # obtain parameters from correctionlib
-    param0_f = cset.get("poly_params").evaluate(abs(eta_f), nL_f, 0)
-    param1_f = cset.get("poly_params").evaluate(abs(eta_f), nL_f, 1)
-    param2_f = cset.get("poly_params").evaluate(abs(eta_f), nL_f, 2)
-
-    # calculate value and return max(0, val)
-    sigma_f = param0_f + param1_f * pt_f + param2_f * pt_f * pt_f
-    sigma_corrected_f = np.where(sigma_f < 0, 0, sigma_f)
-
-    if nested:
-        result = ak.unflatten(sigma_corrected_f, nmuons)
-    else:
-        result = sigma_corrected_f
-
-    return result
-
-
-def get_k(eta, var, cset, nested=False):
-    if nested:
-        eta_f, nmuons = ak.flatten(eta), ak.num(eta)
-    else:
-        eta_f = eta
-
-    # obtain parameters from correctionlib
-    k_data_f = cset.get("k_data").evaluate(abs(eta_f), var)
-    k_mc_f = cset.get("k_mc").evaluate(abs(eta_f), var)
-
-    # calculate residual smearing factor
-    # return 0 if smearing in MC already larger than in data
-    k_f = np.zeros_like(k_data_f)
-    condition = k_mc_f < k_data_f
-    k_f[condition] = (k_data_f[condition] ** 2 - k_mc_f[condition] ** 2) ** 0.5
-
-    if nested:
-        result = ak.unflatten(k_f, nmuons)
+@numba.njit
+def _erfinv(y):
+    """
+    inverse error function (agrees with scipy.special.erfinv to a few ulp): initial
+    guess from M. Giles' single precision approximation, refined with Newton steps on
+    erf(x) = y, or on log(erfc(x)) = log(1 - |y|) in the tails where erf(x) is flat
+    """
+    if not (-1.0 <= y <= 1.0):
+        return np.nan
+    if y == 1.0:
+        return np.inf
+    if y == -1.0:
+        return -np.inf
+    a = abs(y)
+    w = -math.log((1.0 - a) * (1.0 + a))
+    if w < 5.0:
+        w = w - 2.5
+        p = 2.81022636e-08
+        p = 3.43273939e-07 + p * w
+        p = -3.5233877e-06 + p * w
+        p = -4.39150654e-06 + p * w
+        p = 0.00021858087 + p * w
+        p = -0.00125372503 + p * w
+        p = -0.00417768164 + p * w
+        p = 0.246640727 + p * w
+        p = 1.50140941 + p * w
     else:
-        result = k_f
-
-    return result
+        w = math.sqrt(w) - 3.0
+        p = -0.000200214257
+        p = 0.000100950558 + p * w
+        p = 0.00134934322 + p * w
+        p = -0.00367342844 + p * w
+        p = 0.00573950773 + p * w
+        p = -0.0076224613 + p * w
+        p = 0.00943887047 + p * w
+        p = 1.00167406 + p * w
+        p = 2.83297682 + p * w
+    x = p * a
+    log_q = math.log(1.0 - a)
+    # d erf(x) / dx = 2 / sqrt(pi) * exp(-x^2)
+    for _ in range(20):
+        derivative = 1.1283791670955126 * math.exp(-x * x)
+        if a > 0.5:
+            erfc = math.erfc(x)
+            step = (math.log(erfc) - log_q) * erfc / -derivative
+        else:
+            step = (math.erf(x) - a) / derivative
+        x -= step
+        if abs(step) <= 2e-16 * abs(x):
+            break
+    return math.copysign(x, y)
+
+
+# divisions by zero give inf/nan as in numpy (e.g. parameters of empty bins)
+@numba.njit(error_model="numpy")
+def crystal_ball_invcdf(u, m, s, a, n):
+    """
+    inverse CDF of the Crystal Ball function at 'u' (scalar version of the CrystallBall.invcdf
+    of MuonScaRe.py, with the same operations and branch precedence)
+    """
+    pi = 3.14159
+    sqrtPiOver2 = np.sqrt(pi / 2.0)
+    sqrt2 = np.sqrt(2.0)
+    fa = abs(a)
+    ex = np.exp(-fa * fa / 2)
+    C1 = n / fa / (n - 1) * ex
+    D1 = 2 * sqrtPiOver2 * math.erf(fa / sqrt2)
+    C = (D1 + 2 * C1) / C1
+    D = (D1 + 2 * C1) / 2
+    N = 1.0 / s / (D1 + 2 * C1)
+    k = 1.0 / (n - 1)
+    Ns = N * s
+    NC = Ns * C1
+    F = 1 - fa * fa / n
+    G = s * n / fa
+    # cdf at m - a * s and m + a * s
+    cdf_bounds = np.empty(2)
+    for j, x in enumerate((m - a * s, m + a * s)):
+        d = (x - m) / s
+        low, high = F - s * d / G, F + s * d / G
+        # the last matching condition takes precedence, as in the ak.where chain
+        if d > a and high <= 0:
+            cdf_bounds[j] = NC * C
+        elif d > a and high > 0:
+            cdf_bounds[j] = NC * (C - high ** (1 - n))
+        elif d < -a and low <= 0:
+            cdf_bounds[j] = NC
+        elif d < -a and low > 0:
+            cdf_bounds[j] = NC / low ** (n - 1)
+        else:
+            cdf_bounds[j] = Ns * (D - sqrtPiOver2 * math.erf(-d / sqrt2))
+    cdfMa, cdfPa = cdf_bounds[0], cdf_bounds[1]
+    if u > cdfPa and C - u / NC <= 0:
+        return m - G * F
+    if u > cdfPa and C - u / NC > 0:
+        return m - G * (F - (C - u / NC) ** (-k))
+    if u < cdfMa and NC / u <= 0:
+        return m + G * F
+    if u < cdfMa and NC / u > 0:
+        return m + G * (F - (NC / u) ** k)
+    return m - sqrt2 * s * _erfinv((D - u / Ns) / sqrtPiOver2)
+
+
+@numba.njit(error_model="numpy")
+def resolution_kernel(pt, rndm, mean, sigma, n, alpha, poly0, poly1, poly2, k_data, k_mc):
+    """
+    resolution-corrected pT of flat muon arrays: Crystal Ball random number, pT resolution
+    and residual smearing factor (get_rndm, get_std and get_k of MuonScaRe.py) in a single pass
+    """
+    pt_corr = np.empty(pt.shape[0])
+    for i in range(pt.shape[0]):
+        # residual smearing factor (0 if smearing in MC already larger than in data)
+        k = 0.0
+        if k_mc[i] < k_data[i]:
+            k = (k_data[i] ** 2 - k_mc[i] ** 2) ** 0.5
+        std = poly0[i] + poly1[i] * pt[i] + poly2[i] * pt[i] * pt[i]
+        if std < 0:
+            std = 0.0
+        cb = crystal_ball_invcdf(rndm[i], mean[i], sigma[i], alpha[i], n[i])
+        pt_corr[i] = pt[i] * (1 + k * std * cb)
+    return pt_corr
 
 
 def filter_boundaries(pt_corr, pt, nested):
@@ -227,7 +172,7 @@ def filter_boundaries(pt_corr, pt, nested):
     return pt_corr
 
 
-def pt_resol(pt, eta, nL, cset, nested=False):
+def pt_resol(pt, eta, nL, cset, rndm, nested=False):
     """ "
     Function for the calculation of the resolution correction
     Input:
@@ -235,14 +180,43 @@ def pt_resol(pt, eta, nL, cset, nested=False):
     eta - muon pseudorapidity
     nL - muon number of tracker layers
     cset - correctionlib object
+    rndm - flat array with one uniform random number per muon (see analysis.corrections.rng)
 
     This function should only be applied to reco muons in MC!
     """
-    rndm = get_rndm(eta, nL, cset, nested)
-    std = get_std(pt, eta, nL, cset, nested)
-    k = get_k(eta, "nom", cset, nested)
+    if nested:
+        pt_f, eta_f, nL_f, nmuons = (
+            ak.flatten(pt),
+            ak.flatten(eta),
+            ak.flatten(nL),
+            ak.num(nL),
+        )
+    else:
+        pt_f, eta_f, nL_f = pt, eta, nL
+    abseta_f = np.abs(np.asarray(eta_f))
+    nL_f = np.asarray(nL_f)
 
-    pt_corr = pt * (1 + k * std * rndm)
+    # obtain parameters from correctionlib
+    cb_params = [
+        cset.get("cb_params").evaluate(abseta_f, nL_f, i) for i in range(4)
+    ]
+    poly_params = [
+        cset.get("poly_params").evaluate(abseta_f, nL_f, i) for i in range(3)
+    ]
+    k_data_f = cset.get("k_data").evaluate(abseta_f, "nom")
+    k_mc_f = cset.get("k_mc").evaluate(abseta_f, "nom")
+
+    # fused evaluation of the Crystal Ball random number, resolution and smearing factor
+    pt_corr = resolution_kernel(
+        np.asarray(pt_f, dtype=np.float64),
+        np.asarray(rndm, dtype=np.float64),
+        *cb_params,
+        *poly_params,
+        k_data_f,
+        k_mc_f,
+    )
+    if nested:
+        pt_corr = ak.unflatten(pt_corr, nmuons)
 
     pt_corr = filter_boundaries(pt_corr, pt, nested)
 
@@ -402,7 +376,7 @@ def apply_muon_ss_corrections(
 
     # get correction set
     json_path = Path.cwd() / "analysis" / "data" / f"{year}_muonSS.json.gz"
-    cset = correctionlib.CorrectionSet.from_file(str(json_path))
+    cset = get_correction_set(str(json_path))
 
     if hasattr(events, "genWeight"):
         # MC: both scale correction to gen Z peak AND resolution correction to Z width in data
@@ -422,6 +396,8 @@ def apply_muon_ss_corrections(
                 events.Muon.nTrackerLayers,
                 cset,
                 nested=True,
+                # reproducible random numbers, seeded by event and muon index
+                rndm=get_object_uniform(events, events.Muon, "muon_resolution"),
             )
     else:
         # Data: only scale correction to gen Z peak
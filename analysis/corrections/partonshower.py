@@ -1,10 +1,14 @@
 # taken from https://gitlab.cern.ch/cms-analysis/general/HiggsDNA/-/blob/master/higgs_dna/systematics/event_weight_systematics.py?ref_type=heads#L719
 import numpy as np
-def add_partonshower_weight(events, weights_container):
+def add_partonshower_weight(events, weights_container, variation="nominal"):
     """
     Parton Shower weights:
     https://github.com/cms-sw/cmssw/blob/caeae4110ddbada1cfdac195404b3c618584e8fb/PhysicsTools/NanoAOD/plugins/GenWeightsTableProducer.cc#L533-L534
+
+    PS weights only add up/down variations, so nothing is added if 'variation' is not 'nominal'
     """
+    if variation != "nominal":
+        return
     try:
         weights_container.add(
             name="ps_isr",
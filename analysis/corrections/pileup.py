@@ -1,4 +1,4 @@
-import correctionlib
+from analysis.corrections.correction_registry import get_correction_set
 import awkward as ak
 from typing import Type
 from coffea.analysis_tools import Weights
@@ -27,7 +27,7 @@ def add_pileup_weight(
             variations to weights container. else, add only 'nominal' weights.
     """
     # define correction set and goldenJSON file names
-    cset = correctionlib.CorrectionSet.from_file(
+    cset = get_correction_set(
         get_pog_json(json_name="pileup", year=year)
     )
     year_to_corr = {
@@ -0,0 +1,85 @@
+import zlib
+import numpy as np
+import awkward as ak
+from scipy.special import ndtri
+
+# Counter-based random numbers: each draw is a hash of the event identifiers (run,
+# luminosityBlock, event), the index of the object within the event and the name of
+# the random stream, so it does not depend on the chunking, the order in which events
+# are processed or any global random state. The hash is the SplitMix64 mixing function,
+# which maps consecutive counters to statistically independent 64-bit values
+GOLDEN_GAMMA = np.uint64(0x9E3779B97F4A7C15)
+
+
+def mix64(x: np.ndarray) -> np.ndarray:
+    """SplitMix64 finalizer of a uint64 array (arithmetic wraps modulo 2^64)"""
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def get_event_keys(events, stream: str) -> np.ndarray:
+    """return a uint64 key per event from its (run, luminosityBlock, event) and the stream name"""
+    with np.errstate(over="ignore"):
+        keys = mix64(np.full(len(events), zlib.crc32(stream.encode()), dtype=np.uint64))
+        for field in ["run", "luminosityBlock", "event"]:
+            values = ak.to_numpy(events[field]).astype(np.uint64)
+            keys = mix64(keys + values * GOLDEN_GAMMA)
+    return keys
+
+
+def keys_to_uniform(keys: np.ndarray, counters: np.ndarray) -> np.ndarray:
+    """return uniform numbers in (0, 1) from the keys and counters (uint64 arrays)"""
+    with np.errstate(over="ignore"):
+        bits = mix64(keys + (counters + np.uint64(1)) * GOLDEN_GAMMA)
+    # 53 random bits, shifted to the center of their interval to exclude 0 and 1
+    return ((bits >> np.uint64(11)).astype(np.float64) + 0.5) * 2.0**-53
+
+
+def get_event_uniform(events, stream: str) -> np.ndarray:
+    """
+    return one uniform random number in (0, 1) per event
+
+    Parameters:
+    -----------
+        events:
+            Events array with run, luminosityBlock and event fields
+        stream:
+            name of the random stream (each correction uses its own stream)
+    """
+    keys = get_event_keys(events, stream)
+    return keys_to_uniform(keys, np.zeros(len(keys), dtype=np.uint64))
+
+
+def get_object_uniform(events, objects: ak.Array, stream: str) -> np.ndarray:
+    """
+    return one uniform random number in (0, 1) per object, as a flat array ordered as
+    ak.flatten(objects). The draw of an object only depends on its event and its index
+    within the event
+
+    Parameters:
+    -----------
+        events:
+            Events array with run, luminosityBlock and event fields
+        objects:
+            jagged objects array (one list per event)
+        stream:
+            name of the random stream (each correction uses its own stream)
+    """
+    counts = ak.to_numpy(ak.num(objects))
+    keys = np.repeat(get_event_keys(events, stream), counts)
+    # index of each object within its event
+    offsets = np.repeat(np.cumsum(counts) - counts, counts)
+    counters = (np.arange(len(keys)) - offsets).astype(np.uint64)
+    return keys_to_uniform(keys, counters)
+
+
+def get_object_normal(events, objects: ak.Array, stream: str) -> np.ndarray:
+    """return one standard normal random number per object (see get_object_uniform)"""
+    return ndtri(get_object_uniform(events, objects, stream))
+
+
+def get_event_integers(events, low: int, high: int, stream: str) -> np.ndarray:
+    """return one random integer in [low, high) per event"""
+    uniform = get_event_uniform(events, stream)
+    return low + np.floor(uniform * (high - low)).astype(np.int64)
@@ -0,0 +1,41 @@
+# names of the weights with up/down variations added by each 'event_weights' entry
+# of the corrections config (as added in 'weight_manager')
+WEIGHT_VARIATIONS = {
+    "genWeight": [],
+    "pileupWeight": ["pileup"],
+    "partonshowerWeight": ["ps_isr", "ps_fsr"],
+    "lhepdfWeight": ["lhe"],
+    "lhescaleWeight": ["scalevar_muR", "scalevar_muF", "scalevar_muR_muF"],
+    "nnlopsWeight": [],
+    "muon": {"id": ["muon_id"], "iso": ["muon_iso"], "trigger": []},
+    "electron": {
+        "id": ["electron_id"],
+        "reco": [
+            "electron_reco_RecoBelow20",
+            "electron_reco_Reco20to75",
+            "electron_reco_RecoAbove75",
+        ],
+        "trigger": [],
+    },
+}
+
+
+def get_weight_variations(corrections_config) -> list:
+    """
+    return the ordered list of weight variations ('nominal' plus '<weight>Up' and
+    '<weight>Down' for each weight with variations) enabled by the corrections config
+    """
+    variations = ["nominal"]
+    for weight, weight_config in corrections_config["event_weights"].items():
+        if isinstance(weight_config, dict):
+            names = [
+                name
+                for corr, wp in weight_config.items()
+                if wp
+                for name in WEIGHT_VARIATIONS[weight][corr]
+            ]
+        else:
+            names = WEIGHT_VARIATIONS[weight] if weight_config else []
+        for name in names:
+            variations += [f"{name}Up", f"{name}Down"]
+    return variations
@@ -1,3 +1,13 @@
 from analysis.histograms.hist_builder import HistBuilder as HistBuilder
+from analysis.histograms.hist_builder import WORKERS as WORKERS
+from analysis.histograms.hist_builder import HISTOGRAM_COPIES as HISTOGRAM_COPIES
+from analysis.histograms.hist_builder import LazyHistograms as LazyHistograms
+from analysis.histograms.hist_builder import HistogramTemplates as HistogramTemplates
+from analysis.histograms.hist_builder import get_histogram_templates as get_histogram_templates
+from analysis.histograms.sparse_hist import SparseHist as SparseHist
+from analysis.histograms.compact_hist import CompactHist as CompactHist
+from analysis.histograms.compact_hist import compact_histograms as compact_histograms
+from analysis.histograms.compact_hist import expand_histograms as expand_histograms
 from analysis.histograms.hist_filler import fill_histograms as fill_histograms
+from analysis.histograms.hist_filler import BinIndexCache as BinIndexCache
 from analysis.histograms.histogram_config import VariableAxis, RegularAxis, IntCategoryAxis, IntegerAxis, StrCategoryAxis, HistogramConfig
\ No newline at end of file
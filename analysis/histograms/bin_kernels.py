@@ -0,0 +1,181 @@
+import hist
+import numba
+import numpy as np
+
+
+# Each kernel maps the raw values of a variable to their bin index in the
+# flow-inclusive view of an axis, in a single pass over the values buffer. Entries
+# that are missing ('valid' is False), NaN or out of the range of an axis without
+# the corresponding flow bin are not filled ('fill' is False). As in boost-histogram,
+# the upper edge belongs to the last bin of axes without overflow. If 'flow' is True,
+# underflow/overflow values are folded into the first/last bin
+
+
+@numba.njit
+def regular_bin_indices(values, valid, start, stop, nbins, underflow, overflow, flow):
+    """bin indices of a Regular axis (same binning arithmetic as boost-histogram)"""
+    indices = np.zeros(values.shape[0], dtype=np.int64)
+    fill = np.zeros(values.shape[0], dtype=np.bool_)
+    offset = 1 if underflow else 0
+    width = stop - start
+    for i in range(values.shape[0]):
+        x = np.float64(values[i])
+        if not valid[i] or np.isnan(x):
+            continue
+        z = (x - start) / width
+        if z < 1.0:
+            if z >= 0.0:
+                indices[i] = int(z * nbins) + offset
+                fill[i] = True
+            elif flow:
+                indices[i] = offset
+                fill[i] = True
+            elif underflow:
+                indices[i] = 0
+                fill[i] = True
+        elif flow or (not overflow and x == stop):
+            indices[i] = offset + nbins - 1
+            fill[i] = True
+        elif overflow:
+            indices[i] = offset + nbins
+            fill[i] = True
+    return indices, fill
+
+
+@numba.njit
+def variable_bin_indices(values, valid, edges, underflow, overflow, flow):
+    """bin indices of a Variable axis"""
+    indices = np.zeros(values.shape[0], dtype=np.int64)
+    fill = np.zeros(values.shape[0], dtype=np.bool_)
+    offset = 1 if underflow else 0
+    nbins = edges.shape[0] - 1
+    for i in range(values.shape[0]):
+        x = np.float64(values[i])
+        if not valid[i] or np.isnan(x):
+            continue
+        # index of the bin whose [low, high) edges contain x (-1 or nbins if outside)
+        b = np.searchsorted(edges, x, side="right") - 1
+        if b < 0:
+            if flow:
+                b = 0
+            elif not underflow:
+                continue
+        elif b >= nbins:
+            if flow or (not overflow and x == edges[nbins]):
+                b = nbins - 1
+            elif not overflow:
+                continue
+        indices[i] = b + offset
+        fill[i] = True
+    return indices, fill
+
+
+@numba.njit
+def integer_bin_indices(values, valid, start, nbins, underflow, overflow, flow):
+    """bin indices of an Integer axis (values are cast to integer)"""
+    indices = np.zeros(values.shape[0], dtype=np.int64)
+    fill = np.zeros(values.shape[0], dtype=np.bool_)
+    offset = 1 if underflow else 0
+    for i in range(values.shape[0]):
+        x = np.float64(values[i])
+        if not valid[i] or np.isnan(x):
+            continue
+        # int() of +-inf is undefined, so infinite values go straight to the flow bins
+        if np.isinf(x):
+            b = nbins if x > 0 else -1
+        else:
+            b = int(x) - start
+        if b < 0:
+            if flow:
+                b = 0
+            elif underflow:
+                b = -1
+            else:
+                continue
+        elif b >= nbins:
+            if flow:
+                b = nbins - 1
+            elif overflow:
+                b = nbins
+            else:
+                continue
+        indices[i] = b + offset
+        fill[i] = True
+    return indices, fill
+
+
+@numba.njit
+def intcategory_bin_indices(values, valid, categories, overflow):
+    """bin indices of an IntCategory axis (values are cast to integer)"""
+    indices = np.zeros(values.shape[0], dtype=np.int64)
+    fill = np.zeros(values.shape[0], dtype=np.bool_)
+    ncategories = categories.shape[0]
+    sorter = np.argsort(categories)
+    sorted_categories = categories[sorter]
+    for i in range(values.shape[0]):
+        x = np.float64(values[i])
+        if not valid[i] or np.isnan(x):
+            continue
+        if np.isinf(x):
+            # infinite values are not a category (int() of +-inf is undefined)
+            if overflow:
+                indices[i] = ncategories
+                fill[i] = True
+            continue
+        value = int(x)
+        position = np.searchsorted(sorted_categories, value)
+        if position < ncategories and sorted_categories[position] == value:
+            indices[i] = sorter[position]
+            fill[i] = True
+        elif overflow:
+            indices[i] = ncategories
+            fill[i] = True
+    return indices, fill
+
+
+def get_bin_indices(axis, values, valid, flow):
+    """
+    return the flow-inclusive bin index of each value and the mask of the values to
+    fill, using the kernel of the axis type
+    """
+    traits = axis.traits
+    if isinstance(axis, hist.axis.Regular):
+        if axis.transform is not None:
+            raise ValueError(f"Transformed Regular axes are not supported ('{axis.name}')")
+        return regular_bin_indices(
+            values,
+            valid,
+            float(axis.edges[0]),
+            float(axis.edges[-1]),
+            axis.size,
+            traits.underflow,
+            traits.overflow,
+            flow,
+        )
+    if isinstance(axis, hist.axis.Variable):
+        return variable_bin_indices(
+            values,
+            valid,
+            np.asarray(axis.edges, dtype=np.float64),
+            traits.underflow,
+            traits.overflow,
+            flow,
+        )
+    if isinstance(axis, hist.axis.Integer):
+        return integer_bin_indices(
+            values,
+            valid,
+            int(axis.edges[0]),
+            axis.size,
+            traits.underflow,
+            traits.overflow,
+            flow,
+        )
+    if isinstance(axis, hist.axis.IntCategory):
+        return intcategory_bin_indices(
+            values,
+            valid,
+            np.asarray(list(axis), dtype=np.int64),
+            traits.overflow,
+        )
+    raise ValueError(f"No bin index kernel for axis '{axis.name}' of type {type(axis).__name__}")
@@ -0,0 +1,116 @@
+import hist
+import numpy as np
+from analysis.histograms.sparse_hist import SparseHist
+
+
+class CompactHist:
+    """
+    Reduced-size copy of a dense (hist.Hist) or sparse (SparseHist) histogram, used to
+    store job outputs. Sums of weights and variances are kept with 'dtype' precision,
+    and if 'variation_variances' is False variances are only kept for the nominal
+    variation. 'to_hist' restores a float64 histogram (with NaN variances for the
+    variations whose variances were dropped), which is the one to be merged
+
+    Parameters:
+    -----------
+        histogram:
+            hist.Hist or SparseHist histogram
+        dtype:
+            numpy dtype of the stored sums of weights and variances
+        variation_variances:
+            whether to keep the variances of the systematic variations
+    """
+
+    def __init__(self, histogram, dtype="float32", variation_variances=True):
+        self.axes = tuple(histogram.axes)
+        self.storage_type = histogram.storage_type
+        self.sparse = isinstance(histogram, SparseHist)
+        if self.sparse:
+            # flat bin indices fit in 32 bits unless the histogram has over 2^31 bins
+            keys_dtype = np.int32 if np.prod(self.shape) < 2**31 else np.int64
+            self.keys = histogram.keys.astype(keys_dtype)
+            sumw, sumw2 = histogram.sumw, histogram.sumw2
+        else:
+            view = histogram.view(flow=True)
+            if self.storage_type is hist.storage.Weight:
+                sumw, sumw2 = view.value, view.variance
+            else:
+                sumw, sumw2 = view, None
+        # variances are dropped for all variations but 'nominal'
+        self.nominal_variances_only = (
+            sumw2 is not None and not variation_variances and self.has_variations
+        )
+        if self.nominal_variances_only:
+            sumw2 = sumw2[self.get_nominal_mask()]
+        self.sumw = sumw.astype(dtype)
+        self.sumw2 = None if sumw2 is None else sumw2.astype(dtype)
+
+    @property
+    def has_variations(self) -> bool:
+        return any(axis.name == "variation" for axis in self.axes)
+
+    @property
+    def shape(self) -> tuple:
+        return tuple(axis.extent for axis in self.axes)
+
+    def get_nominal_mask(self):
+        """return the mask of the stored bins that belong to the nominal variation"""
+        position = [axis.name for axis in self.axes].index("variation")
+        nominal_index = self.axes[position].index("nominal")
+        if self.sparse:
+            return np.unravel_index(self.keys, self.shape)[position] == nominal_index
+        mask_shape = [1] * len(self.shape)
+        mask_shape[position] = self.shape[position]
+        mask = np.zeros(mask_shape, dtype=bool)
+        mask.reshape(-1)[nominal_index] = True
+        return np.broadcast_to(mask, self.shape)
+
+    def restore_variances(self):
+        if self.sumw2 is None or not self.nominal_variances_only:
+            return None if self.sumw2 is None else self.sumw2.astype(np.float64)
+        sumw2 = np.full(self.sumw.shape, np.nan)
+        sumw2[self.get_nominal_mask()] = self.sumw2
+        return sumw2
+
+    def to_hist(self):
+        """return the float64 hist.Hist (or SparseHist) histogram"""
+        sumw, sumw2 = self.sumw.astype(np.float64), self.restore_variances()
+        if self.sparse:
+            histogram = SparseHist(*self.axes, storage=self.storage_type())
+            histogram.keys = self.keys.astype(np.int64)
+            histogram.sumw = sumw
+            histogram.sumw2 = sumw2
+            return histogram
+        histogram = hist.Hist(*self.axes, storage=self.storage_type())
+        view = histogram.view(flow=True)
+        if sumw2 is not None:
+            view.value = sumw
+            view.variance = sumw2
+        else:
+            view[...] = sumw
+        return histogram
+
+
+def compact_histograms(histograms: dict, histogram_config) -> dict:
+    """return the histograms with the storage precision of the histogram config"""
+    if (
+        histogram_config.output_precision == "float64"
+        and histogram_config.variation_variances
+    ):
+        return histograms
+    return {
+        key: CompactHist(
+            histogram,
+            dtype=histogram_config.output_precision,
+            variation_variances=histogram_config.variation_variances,
+        )
+        for key, histogram in histograms.items()
+    }
+
+
+def expand_histograms(histograms: dict) -> dict:
+    """return the float64 histograms of a job output, to be merged"""
+    return {
+        key: histogram.to_hist() if isinstance(histogram, CompactHist) else histogram
+        for key, histogram in histograms.items()
+    }
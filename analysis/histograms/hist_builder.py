@@ -1,4 +1,73 @@
 import hist
+import numpy as np
+from analysis.histograms.sparse_hist import SparseHist
+
+# number of worker processes of each job (see submit.py)
+WORKERS = 4
+# copies of the (dense) histograms held by a job: the templates only hold the axes, so
+# each worker holds the histograms filled in its current chunk, and the main process
+# holds the accumulated output plus the chunk output being added to it (chunk outputs
+# are sent back as compressed pickles and unpacked one at a time)
+HISTOGRAM_COPIES = WORKERS + 2
+
+
+class HistogramTemplates:
+    """
+    Prebuilt axes of the histograms of a workflow config. 'new' returns an empty
+    histogram with fresh storage that reuses the axes, so the axes are only built once
+    and no (possibly large) template storage has to be allocated, copied or pickled
+    """
+
+    def __init__(self, workflow_config):
+        self.hist_builder = HistBuilder(workflow_config)
+        self.axes = self.hist_builder.get_histogram_axes()
+
+    def new(self, key, nominal_only: bool = False):
+        """
+        return an empty histogram with the axes of 'key'. If 'nominal_only', the
+        variation axis only has the 'nominal' variation (outputs processed with
+        '--nominal_only')
+        """
+        axes = self.axes[key]
+        if nominal_only:
+            axes = [
+                hist.axis.StrCategory(name="variation", categories=["nominal"], overflow=False)
+                if axis.name == "variation"
+                else axis
+                for axis in axes
+            ]
+        return self.hist_builder.make_histogram(axes)
+
+
+# histogram templates built in this process, by histogram config hash
+_TEMPLATES_CACHE = {}
+
+
+def get_histogram_templates(workflow_config) -> HistogramTemplates:
+    """
+    return the histogram templates of a workflow config. They are built once per
+    process (e.g. once per worker) and cached by the histogram config hash
+    """
+    key = workflow_config.histogram_config.get_hash()
+    if key not in _TEMPLATES_CACHE:
+        _TEMPLATES_CACHE[key] = HistogramTemplates(workflow_config)
+    return _TEMPLATES_CACHE[key]
+
+
+class LazyHistograms(dict):
+    """
+    Histograms dictionary where each histogram is only allocated, as an empty
+    histogram from its template, the first time it is accessed. Chunks where no
+    category has selected events therefore produce an empty dictionary
+    """
+
+    def __init__(self, templates: HistogramTemplates):
+        super().__init__()
+        self.templates = templates
+
+    def __missing__(self, key):
+        self[key] = self.templates.new(key)
+        return self[key]
 
 
 class HistBuilder:
@@ -16,39 +85,15 @@ class HistBuilder:
             name="category", categories=self.histogram_config.categories
         )
 
-    def build_histogram(self):
-        if self.histogram_config.stack:
-            histograms = {}
-            for hist_name, axes_names in self.histogram_config.layout.items():
-                histograms[hist_name] = self.build_stacked_histogram(axes_names)
-        else:
-            histograms = self.build_individual_histogram()
-        return histograms
-
-    def build_individual_histogram(self):
-        histograms = {}
-        for axis in self.histogram_config.axes:
-            axes = [self.build_axis(axis)]
-            if len(histogram_config.categories) > 1:
-                axes.append(self.cat_axis)
-            if self.histogram_config.add_syst_axis:
-                axes.append(self.get_syst_axis())
-            if self.histogram_config.add_weight:
-                axes.append(hist.storage.Weight())
-            histograms[axis] = hist.Hist(*axes)
-        return histograms
-
-    def build_stacked_histogram(self, axes_names):
-        axes = []
-        for axis in axes_names:
-            axes.append(self.build_axis(axis))
-        if len(self.histogram_config.categories) > 1:
-            axes.append(self.cat_axis)
-        if self.histogram_config.add_syst_axis:
-            axes.append(self.get_syst_axis())
+    def make_histogram(self, axes: list):
+        """build a dense (hist.Hist) or sparse (SparseHist) histogram with the given axes"""
         if self.histogram_config.add_weight:
-            axes.append(hist.storage.Weight())
-        return hist.Hist(*axes)
+            storage = hist.storage.Weight()
+        else:
+            storage = hist.storage.Double()
+        if self.histogram_config.storage == "sparse":
+            return SparseHist(*axes, storage=storage)
+        return hist.Hist(*axes, storage=storage)
 
     def build_axis(self, axis_name: dict):
         """build a hist axis object from an axis config"""
@@ -57,4 +102,86 @@ class HistBuilder:
         return self.axis_opt[hist_type](**axis_args)
 
     def get_syst_axis(self):
-        return hist.axis.StrCategory(name="variation", categories=[], growth=True)
+        # fixed axis with every variation enabled in the corrections config, so all
+        # histograms share the same variation order and merge as plain array adds
+        return hist.axis.StrCategory(
+            name="variation", categories=self.histogram_config.variations, overflow=False
+        )
+
+    def get_histogram_axes(self) -> dict:
+        """return the axes of each histogram of the layout"""
+        if self.histogram_config.stack:
+            layout = self.histogram_config.layout
+        else:
+            layout = {axis: [axis] for axis in self.histogram_config.axes}
+        histogram_axes = {}
+        for hist_name, axes_names in layout.items():
+            axes = [self.build_axis(axis) for axis in axes_names]
+            if len(self.histogram_config.categories) > 1:
+                axes.append(self.cat_axis)
+            if self.histogram_config.add_syst_axis:
+                axes.append(self.get_syst_axis())
+            histogram_axes[hist_name] = axes
+        return histogram_axes
+
+    def estimate_memory(self) -> dict:
+        """
+        return the number of bins (including flow bins) and the size in bytes of each
+        histogram, without allocating them. The size of sparse histograms depends on
+        the number of filled bins, so their upper bound (all bins filled) is given
+        """
+        # bytes per bin: sum of weights (and sum of squared weights for Weight storage),
+        # plus the bin index for sparse histograms
+        bin_bytes = 16 if self.histogram_config.add_weight else 8
+        if self.histogram_config.storage == "sparse":
+            bin_bytes += 8
+        estimate = {}
+        for hist_name, axes in self.get_histogram_axes().items():
+            nbins = int(np.prod([axis.extent for axis in axes]))
+            estimate[hist_name] = {
+                "axes": [axis.name for axis in axes],
+                "storage": self.histogram_config.storage,
+                "bins": nbins,
+                "bytes": nbins * bin_bytes,
+            }
+        return estimate
+
+    def check_memory_budget(self, max_memory: float = None, copies: int = 1):
+        """
+        raise a ValueError if 'copies' copies of the (dense) histograms exceed the memory
+        budget, given by the 'max_memory' field of the histogram config and/or by
+        'max_memory' (the smallest is used). Returns the estimated size in MB
+
+        Parameters:
+        -----------
+            max_memory:
+                job memory budget in MB
+            copies:
+                number of copies of the histograms held by a job (chunk histograms
+                of each worker and accumulated output)
+        """
+        estimate = self.estimate_memory()
+        histograms_mb = (
+            sum(
+                info["bytes"]
+                for info in estimate.values()
+                if info["storage"] == "dense"
+            )
+            * copies
+            / 1e6
+        )
+        budgets = [
+            budget
+            for budget in [self.histogram_config.max_memory, max_memory]
+            if budget is not None
+        ]
+        if budgets and histograms_mb > min(budgets):
+            largest = sorted(estimate.items(), key=lambda item: -item[1]["bytes"])[:3]
+            raise ValueError(
+                f"Histograms need {histograms_mb:.0f} MB "
+                f"({copies} copies) and exceed the memory budget of {min(budgets):.0f} MB. "
+                f"Largest histograms [MB]: "
+                f"{dict((name, round(info['bytes'] / 1e6, 1)) for name, info in largest)}. "
+                "Consider reducing the binning or setting 'storage: sparse'"
+            )
+        return histograms_mb
@@ -1,133 +1,206 @@
+import hist
 import numpy as np
 import awkward as ak
+from analysis.histograms.sparse_hist import SparseHist
+from analysis.histograms.bin_kernels import get_bin_indices
 
 
-def normalize(array: ak.Array):
+def get_entries(array: ak.Array):
+    """
+    return the flat values of a variable, the mask of its valid (not None) entries
+    and its number of entries per event (None if the variable is flat). Values are read
+    from the content buffer of the array (after slicing it with its offsets), so no
+    flattened or NaN-filled copies are made
+    """
+    counts = None
     if array.ndim == 2:
-        return ak.fill_none(ak.flatten(array), np.nan)
+        # events with a None list have no entries
+        counts = ak.to_numpy(ak.fill_none(ak.num(array), 0))
+        array = ak.flatten(array)
+    values = ak.to_numpy(array, allow_missing=True)
+    if isinstance(values, np.ma.MaskedArray):
+        valid = ~np.ma.getmaskarray(values)
+        values = values.data
     else:
-        return ak.fill_none(array, np.nan)
+        valid = np.ones(len(values), dtype=bool)
+    return values, valid, counts
 
 
-def get_flow_array(histogram, variable, variables_map):
-    histogram_edges = histogram.axes[variable].edges
-    epsilon = (histogram_edges[-1] - histogram_edges[-2]) / 2
-    hist_max_bin_edge = histogram_edges[-1] - epsilon
-    hist_min_bin_edge = histogram_edges[0]
-    return np.maximum(
-        np.minimum(normalize(variables_map[variable]), hist_max_bin_edge),
-        hist_min_bin_edge,
-    )
+class BinIndexCache:
+    """
+    Bin indices of the histogram variables of a chunk. Each variable is binned once
+    for the whole chunk, and the result is sliced once per category, so variables
+    shared by several layout groups or categories reuse it
 
+    Parameters:
+    -----------
+        histogram_config:
+            HistogramConfig object
+        variables_map:
+            {variable: array} dictionary with the chunk-level (not masked) variables
+        flow:
+            whether to add underflow/overflow values to the first/last bin
+    """
 
-def get_variable_array(histogram, histogram_config, variable, variables_map, flow):
-    if histogram_config.axes[variable].type in ["IntCategory", "Integer"]:
-        # cast to integer array
-        variable_array = normalize(variables_map[variable])
-        variable_array = ak.to_numpy(variable_array).astype(int)
-    elif flow:
-        # add underflow/overflow to first/last bin
-        variable_array = get_flow_array(
-            histogram=histogram,
-            variable=variable,
-            variables_map=variables_map,
-        )
-    else:
-        variable_array = normalize(variables_map[variable])
-    return variable_array
+    def __init__(self, histogram_config, variables_map, flow=True):
+        self.histogram_config = histogram_config
+        self.variables_map = variables_map
+        self.flow = flow
+        self._chunk_indices = {}
+        self._category_indices = {}
+
+    def chunk_indices(self, axis):
+        """return the entry indices, in-range mask and counts per event (None if flat) of a variable"""
+        variable = axis.name
+        if variable not in self._chunk_indices:
+            values, valid, counts = get_entries(self.variables_map[variable])
+            # underflow/overflow values of integer axes are kept in their flow bins
+            axis_type = self.histogram_config.axes[variable].type
+            indices, in_range = get_bin_indices(
+                axis=axis,
+                values=values,
+                valid=valid,
+                flow=self.flow and axis_type not in ["IntCategory", "Integer"],
+            )
+            self._chunk_indices[variable] = (indices, in_range, counts)
+        return self._chunk_indices[variable]
+
+    def category_indices(self, axis, category, category_mask):
+        """return the entry indices, in-range mask and counts per event of a variable within a category"""
+        key = (axis.name, category)
+        if key not in self._category_indices:
+            indices, in_range, counts = self.chunk_indices(axis)
+            entry_mask = (
+                category_mask if counts is None else np.repeat(category_mask, counts)
+            )
+            self._category_indices[key] = (
+                indices[entry_mask],
+                in_range[entry_mask],
+                None if counts is None else counts[category_mask],
+            )
+        return self._category_indices[key]
 
 
 def fill_histogram(
-    histograms, histogram_config, variables_map, category, weights, variation, flow=True
+    histograms,
+    histogram_config,
+    bin_indices,
+    category,
+    category_mask,
+    weights,
+    variations,
 ):
+    """
+    fill every histogram with all weight variations in a single pass: the bin index of
+    each entry is taken from the chunk bin-index cache and the (n_entries, n_variations)
+    weights matrix is added to the histogram view with one scatter-add for the sums of
+    weights and one for the sums of squared weights
+
+    Parameters:
+    -----------
+        bin_indices:
+            BinIndexCache of the chunk
+        category_mask:
+            chunk mask of the category events
+        weights:
+            (n_events, n_variations) array with the weights of each variation for the
+            category events
+        variations:
+            variation names of the weights columns
+    """
     if histogram_config.layout == "individual":
-        for variable in histograms:
-            variable_array = get_variable_array(
-                histogram=histograms[variable],
-                histogram_config=histogram_config,
-                variable=variable,
-                variables_map=variables_map,
-                flow=flow,
-            )
-            fill_args = {variable: variable_array}
-            if len(histogram_config.categories) > 1:
-                fill_args.update({"category": category})
-            if histogram_config.add_syst_axis:
-                fill_args.update({"variation": variation})
-            if histogram_config.add_weight:
-                weights = fill_kwargs["weights"]
-                fill_args.update(
-                    {
-                        "weights": (
-                            ak.flatten(ak.ones_like(variables_map[variable]) * weights)
-                            if variables_map[variable].ndim == 2
-                            else weights
-                        ),
-                    }
-                )
-            histograms[variable].fill(**fill_args)
+        layout = {variable: [variable] for variable in histogram_config.axes}
     else:
-        for key, variables in histogram_config.layout.items():
-            fill_args = {}
-            for variable in variables:
-                fill_args[variable] = get_variable_array(
-                    histogram=histograms[key],
-                    histogram_config=histogram_config,
-                    variable=variable,
-                    variables_map=variables_map,
-                    flow=flow,
-                )
-            if len(histogram_config.categories) > 1:
-                fill_args.update({"category": category})
-            if histogram_config.add_syst_axis:
-                fill_args.update({"variation": variation})
-            if histogram_config.add_weight:
-                fill_args.update(
-                    {
-                        "weight": (
-                            ak.flatten(ak.ones_like(variables_map[variable]) * weights)
-                            if variables_map[variable].ndim == 2
-                            else weights
-                        ),
-                    }
-                )
-            histograms[key].fill(**fill_args)
+        layout = histogram_config.layout
+    weights = np.asarray(weights, dtype=np.float64)
+    if not histogram_config.add_weight:
+        weights = np.ones_like(weights)
+    for key, variables in layout.items():
+        histogram = histograms[key]
+        # entries of jagged variables share the weights of their event
+        counts = bin_indices.category_indices(
+            histogram.axes[variables[-1]], category, category_mask
+        )[2]
+        entry_weights = weights if counts is None else np.repeat(weights, counts, axis=0)
+        shape = tuple(axis.extent for axis in histogram.axes)
+        strides = np.cumprod((1,) + shape[:0:-1])[::-1]
+        flat_index = np.zeros(len(entry_weights), dtype=np.int64)
+        valid = np.ones(len(entry_weights), dtype=bool)
+        variation_index = np.zeros(len(variations), dtype=np.int64)
+        for axis, stride in zip(histogram.axes, strides):
+            if axis.name == "variation":
+                variation_index = np.array(
+                    [axis.index(variation) for variation in variations]
+                ) * stride
+                continue
+            if axis.name == "category":
+                flat_index += axis.index(category) * stride
+                continue
+            indices, in_range, _ = bin_indices.category_indices(
+                axis, category, category_mask
+            )
+            flat_index += indices * stride
+            valid &= in_range
+        # (entry, variation) bin of every weight in the flow-inclusive view
+        bins = (flat_index[valid, None] + variation_index[None, :]).ravel()
+        entry_weights = entry_weights[valid].ravel()
+        if isinstance(histogram, SparseHist):
+            histogram.fill_flat(bins, entry_weights)
+            continue
+        # reduce the entries to the touched bins, so the cost scales with the number
+        # of entries instead of the number of bins of the histogram
+        touched, inverse = np.unique(bins, return_inverse=True)
+        sumw = np.bincount(inverse, weights=entry_weights, minlength=len(touched))
+        # the view has the (Fortran-ordered) storage layout, so bins are addressed
+        # by their coordinates instead of a flattened copy
+        coordinates = np.unravel_index(touched, shape)
+        view = histogram.view(flow=True)
+        if histogram.storage_type is hist.storage.Weight:
+            sumw2 = np.bincount(
+                inverse, weights=entry_weights**2, minlength=len(touched)
+            )
+            view.value[coordinates] += sumw
+            view.variance[coordinates] += sumw2
+        else:
+            view[coordinates] += sumw
 
 
 def fill_histograms(
     histograms,
     histogram_config,
-    variables_map,
+    bin_indices,
     category,
-    variation,
-    flow,
+    category_mask,
     is_mc,
     weights_container,
 ):
-    if is_mc:
-        variations = ["nominal"] + list(weights_container.variations)
-        for variation in variations:
-            if variation == "nominal":
-                region_weight = weights_container.weight()
-            else:
-                region_weight = weights_container.weight(modifier=variation)
-            fill_histogram(
-                histograms=histograms,
-                histogram_config=histogram_config,
-                variables_map=variables_map,
-                weights=region_weight,
-                variation=variation,
-                category=category,
-                flow=True,
+    # stack the nominal and varied weights into one (n_events, n_variations) matrix,
+    # with a column for each variation of the (fixed) variation axis
+    variations = ["nominal"]
+    if is_mc and histogram_config.add_syst_axis:
+        variations = histogram_config.variations
+        undeclared = set(weights_container.variations) - set(variations)
+        if undeclared:
+            raise ValueError(
+                f"Weight variations {sorted(undeclared)} are not declared in WEIGHT_VARIATIONS"
             )
-    else:
-        region_weight = weights_container.weight()
-        fill_histogram(
-            histograms=histograms,
-            histogram_config=histogram_config,
-            variables_map=variables_map,
-            weights=region_weight,
-            variation="nominal",
-            category=category,
-            flow=True,
-        )
+    nominal = weights_container.weight()
+    weights = np.stack(
+        [
+            # weights without a given variation in this dataset keep the nominal value
+            weights_container.weight(modifier=variation)
+            if variation in weights_container.variations
+            else nominal
+            for variation in variations
+        ],
+        axis=1,
+    )
+    fill_histogram(
+        histograms=histograms,
+        histogram_config=histogram_config,
+        bin_indices=bin_indices,
+        category=category,
+        category_mask=category_mask,
+        weights=weights,
+        variations=variations,
+    )
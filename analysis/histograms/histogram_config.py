@@ -1,3 +1,5 @@
+import json
+import hashlib
 from dataclasses import dataclass, field
 from typing import Union, Dict, Any, List
 
@@ -135,13 +137,36 @@ class HistogramConfig:
             if True histograms will include a StrCategory axis for systematics
         add_weight:
             if True hist.storage.Weight() will be added to the histograms
+        storage:
+            "dense" (default) for hist.Hist histograms or "sparse" for SparseHist histograms,
+            which only store the filled bins (useful for layouts with many axes)
+        max_memory:
+            memory budget in MB for the histograms of a job. Jobs whose histograms
+            would exceed it are not submitted (see HistBuilder.check_memory_budget)
+        output_precision:
+            "float64" (default) or "float32", precision of the histograms saved in the job
+            outputs. Histograms are restored to float64 before being merged
+        variation_variances:
+            if False, only the variances of the nominal variation are saved in the job outputs
     """
     axes: Dict[str, Any]
     layout: Union[str, Dict[str, List[str]]]
     add_weight: bool = True
     add_syst_axis: bool = True
+    storage: str = "dense"
+    max_memory: float = None
+    output_precision: str = "float64"
+    variation_variances: bool = True
 
     def __post_init__(self):
+        if self.storage not in ["dense", "sparse"]:
+            raise ValueError(
+                f"Invalid histogram storage '{self.storage}'. Options: 'dense', 'sparse'"
+            )
+        if self.output_precision not in ["float64", "float32"]:
+            raise ValueError(
+                f"Invalid output precision '{self.output_precision}'. Options: 'float64', 'float32'"
+            )
         # set variables attribute
         if isinstance(self.layout, str):
             self.stack = False
@@ -173,6 +198,27 @@ class HistogramConfig:
         return {
             "add_syst_axis": self.add_syst_axis,
             "add_weight": self.add_weight,
+            "storage": self.storage,
+            "max_memory": self.max_memory,
+            "output_precision": self.output_precision,
+            "variation_variances": self.variation_variances,
             "axes": self.dict_axes,
             "layout": self.layout,
-        }
\ No newline at end of file
+        }
+
+    def get_hash(self) -> str:
+        """return a hash of everything that defines the histograms built from the config"""
+        config = {
+            "axes": {
+                name: [axis.type, axis.build_args] for name, axis in self.axes.items()
+            },
+            "layout": self.layout,
+            "categories": getattr(self, "categories", None),
+            "variations": getattr(self, "variations", None),
+            "add_weight": self.add_weight,
+            "add_syst_axis": self.add_syst_axis,
+            "storage": self.storage,
+        }
+        return hashlib.sha256(
+            json.dumps(config, sort_keys=True, default=str).encode()
+        ).hexdigest()
@@ -0,0 +1,157 @@
+import hist
+import numpy as np
+from hist.axestuple import NamedAxesTuple
+
+
+class SparseHist:
+    """
+    Sparse (COO) histogram that only stores the filled bins. Bins are identified by
+    their flat index in the flow-inclusive dense view, and their sums of weights (and
+    sums of squared weights for Weight storage) are kept in sorted arrays, so memory and
+    pickle size grow with the number of filled bins instead of the product of the axes
+    sizes. Use 'project' or 'to_hist' to get dense hist.Hist projections
+
+    Parameters:
+    -----------
+        axes:
+            hist axes of the histogram
+        storage:
+            hist.storage.Weight() or hist.storage.Double()
+    """
+
+    def __init__(self, *axes, storage=None):
+        self.axes = NamedAxesTuple(axes)
+        self.storage_type = type(storage) if storage is not None else hist.storage.Double
+        self.shape = tuple(axis.extent for axis in self.axes)
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.sumw = np.zeros(0, dtype=np.float64)
+        self.sumw2 = (
+            np.zeros(0, dtype=np.float64)
+            if self.storage_type is hist.storage.Weight
+            else None
+        )
+
+    @property
+    def nbytes(self) -> int:
+        return sum(
+            array.nbytes
+            for array in [self.keys, self.sumw, self.sumw2]
+            if array is not None
+        )
+
+    def copy(self):
+        out = SparseHist(*self.axes, storage=self.storage_type())
+        out.keys = self.keys.copy()
+        out.sumw = self.sumw.copy()
+        if self.sumw2 is not None:
+            out.sumw2 = self.sumw2.copy()
+        return out
+
+    def fill_flat(self, bins, weights):
+        """add 'weights' to the bins with flat (flow-inclusive) indices 'bins'"""
+        bins = np.asarray(bins, dtype=np.int64)
+        weights = np.asarray(weights, dtype=np.float64)
+        sumw2 = weights**2 if self.sumw2 is not None else None
+        self._merge(bins, weights, sumw2)
+        return self
+
+    def _merge(self, keys, sumw, sumw2):
+        # sum the new entries into the stored bins (duplicated keys are reduced)
+        all_keys = np.concatenate([self.keys, keys])
+        self.keys, inverse = np.unique(all_keys, return_inverse=True)
+        self.sumw = np.bincount(
+            inverse, weights=np.concatenate([self.sumw, sumw]), minlength=len(self.keys)
+        )
+        if self.sumw2 is not None:
+            self.sumw2 = np.bincount(
+                inverse,
+                weights=np.concatenate([self.sumw2, sumw2]),
+                minlength=len(self.keys),
+            )
+
+    def _check_compatible(self, other):
+        if not isinstance(other, SparseHist) or other.axes != self.axes:
+            raise ValueError("Cannot add sparse histograms with different axes")
+        if other.storage_type is not self.storage_type:
+            raise ValueError("Cannot add sparse histograms with different storages")
+
+    def __iadd__(self, other):
+        self._check_compatible(other)
+        self._merge(other.keys, other.sumw, other.sumw2)
+        return self
+
+    def __add__(self, other):
+        return self.copy().__iadd__(other)
+
+    __radd__ = __add__
+
+    def __mul__(self, factor):
+        out = self.copy()
+        out.sumw *= factor
+        if out.sumw2 is not None:
+            out.sumw2 *= factor**2
+        return out
+
+    __rmul__ = __mul__
+
+    def __getitem__(self, selector: dict):
+        """
+        select a single bin of some axes, as in hist.Hist[{axis: value}], with 'value' a
+        category (str) or a bin index (int/bool). The selected axes are removed
+        """
+        coordinates = np.unravel_index(self.keys, self.shape)
+        mask = np.ones(len(self.keys), dtype=bool)
+        for name, value in selector.items():
+            axis_position = self.axes.name.index(name)
+            axis = self.axes[axis_position]
+            if isinstance(value, str):
+                index = axis.index(value)
+            elif isinstance(value, (bool, int, np.integer)):
+                index = int(value)
+            else:
+                raise ValueError(
+                    f"Unsupported selection {value!r} for axis '{name}' of a sparse histogram"
+                )
+            mask &= coordinates[axis_position] == index + int(axis.traits.underflow)
+        keep = [i for i, axis in enumerate(self.axes) if axis.name not in selector]
+        out = SparseHist(
+            *[self.axes[i] for i in keep], storage=self.storage_type()
+        )
+        keys = np.ravel_multi_index(
+            tuple(coordinates[i][mask] for i in keep), out.shape
+        )
+        out._merge(
+            keys,
+            self.sumw[mask],
+            None if self.sumw2 is None else self.sumw2[mask],
+        )
+        return out
+
+    def project(self, *names):
+        """return a dense hist.Hist with the 'names' axes, summing over the other axes"""
+        positions = [self.axes.name.index(name) for name in names]
+        histogram = hist.Hist(
+            *[self.axes[i] for i in positions], storage=self.storage_type()
+        )
+        coordinates = np.unravel_index(self.keys, self.shape)
+        shape = tuple(self.shape[i] for i in positions)
+        bins = np.ravel_multi_index(tuple(coordinates[i] for i in positions), shape)
+        size = int(np.prod(shape))
+        sumw = np.bincount(bins, weights=self.sumw, minlength=size).reshape(shape)
+        view = histogram.view(flow=True)
+        if self.sumw2 is not None:
+            view.value = sumw
+            view.variance = np.bincount(
+                bins, weights=self.sumw2, minlength=size
+            ).reshape(shape)
+        else:
+            view[...] = sumw
+        return histogram
+
+    def to_hist(self):
+        """return the dense hist.Hist with all axes"""
+        return self.project(*self.axes.name)
+
+    def __repr__(self):
+        axes = ", ".join(self.axes.name)
+        return f"SparseHist({axes}, filled bins={len(self.keys)}, storage={self.storage_type.__name__})"
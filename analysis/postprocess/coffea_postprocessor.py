@@ -6,9 +6,12 @@ import pandas as pd
 from pathlib import Path
 from coffea.util import load, save
 from coffea.processor import accumulate
+from analysis.utils import get_profile_table
+from analysis.histograms import expand_histograms, HistogramTemplates
 from analysis.postprocess.utils import (
     print_header,
     get_variations_keys,
+    get_category_cutflow,
     find_kin_and_axis,
 )
 
@@ -19,6 +22,7 @@ def save_process_histograms_by_sample(
     year: str,
     output_dir: str,
     categories,
+    histogram_templates: HistogramTemplates,
 ):
     print_header(f"Processing {sample} outputs")
 
@@ -37,8 +41,8 @@ def save_process_histograms_by_sample(
     for fname in grouped_outputs[sample]:
         output = load(fname)
         if output:
-            # group histograms by sample
-            grouped_histograms.append(output["histograms"])
+            # group histograms by sample (merged with float64 precision)
+            grouped_histograms.append(expand_histograms(output["histograms"]))
             # group metadata by sample
             for meta_key in output["metadata"]:
                 if meta_key in grouped_metadata:
@@ -46,10 +50,21 @@ def save_process_histograms_by_sample(
                 else:
                     grouped_metadata[meta_key] = [output["metadata"][meta_key]]
 
-    histograms = accumulate(grouped_histograms)
+    histograms = accumulate(grouped_histograms) or {}
     metadata = {}
     for meta_key in grouped_metadata:
         metadata[meta_key] = accumulate(grouped_metadata[meta_key])
+    # histograms are only stored once filled, so add the missing ones empty
+    for key in histogram_templates.axes:
+        if key not in histograms:
+            histograms[key] = histogram_templates.new(
+                key, nominal_only=metadata.get("nominal_only", False)
+            )
+
+    if "profile" in metadata:
+        logging.info(f"Processing profile:\n{get_profile_table(metadata['profile'])}\n")
+    if "correction_sets" in metadata:
+        logging.info(f"Correction set cache: {metadata['correction_sets']}")
 
     logging.info("Scaling lumi-xsec weights")
     lumi_file = Path.cwd() / "analysis" / "postprocess" / "luminosity.yaml"
@@ -85,7 +100,8 @@ def save_process_histograms_by_sample(
             category_dir.mkdir(parents=True, exist_ok=True)
         scaled_cutflow[category] = {}
         if category in metadata:
-            for cut, nevents in metadata[category]["cutflow"].items():
+            # preselection cuts (saved apart from the weighted cutflow) come first
+            for cut, nevents in get_category_cutflow(metadata[category]).items():
                 scaled_cutflow[category][cut] = nevents * weight
         processed_cutflow = {sample: scaled_cutflow[category]}
         cutflow_file = Path(
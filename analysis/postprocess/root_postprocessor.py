@@ -10,7 +10,13 @@ from glob import glob
 from pathlib import Path
 from coffea.processor import accumulate
 from analysis.workflows.config import WorkflowConfigBuilder
-from analysis.postprocess.utils import open_output, print_header, df_to_latex
+from analysis.postprocess.utils import (
+    open_output,
+    print_header,
+    df_to_latex,
+    get_category_cutflow,
+    label_preselection_cuts,
+)
 
 
 class ROOTPostprocessor:
@@ -40,6 +46,7 @@ class ROOTPostprocessor:
         config_builder = WorkflowConfigBuilder(workflow=workflow, year=year)
         workflow_config = config_builder.build_workflow_config()
         self.histogram_config = workflow_config.histogram_config
+        self.preselection = workflow_config.event_selection.get("preselection", [])
 
     def run_postprocess(self):
         self.merge_metadata()
@@ -69,6 +76,7 @@ class ROOTPostprocessor:
                 if process not in ["Data", "Total Background"]
             ]
         ]
+        self.cutflow_df = label_preselection_cuts(self.cutflow_df, self.preselection)
         logging.info("\nCutflow by process")
         logging.info(
             f'{self.cutflow_df.applymap(lambda x: f"{x:.3f}" if pd.notnull(x) else "")}\n'
@@ -223,7 +231,7 @@ class ROOTPostprocessor:
         self.scaled_cutflow = {}
         for sample in self.metadata:
             self.scaled_cutflow[sample] = {}
-            for cut, nevents in self.metadata[sample]["cutflow"].items():
+            for cut, nevents in get_category_cutflow(self.metadata[sample]).items():
                 self.scaled_cutflow[sample][cut] = nevents * self.weights[sample]
 
     def group_cutflow(self):
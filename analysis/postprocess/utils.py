@@ -115,6 +115,29 @@ def combine_cutflows(df1, df2):
     return combined
 
 
+def get_category_cutflow(category_metadata: dict) -> dict:
+    """
+    return the cutflow of a category with all its cuts, in the category order: the
+    preselection cuts ('preselection_cutflow', weighted only with the generator weights
+    for MC) followed by the cuts of the fully weighted 'cutflow'
+    """
+    cutflow = {"initial": category_metadata["cutflow"]["initial"]}
+    for cut, nevents in category_metadata.get("preselection_cutflow", {}).items():
+        if cut != "initial":
+            cutflow[cut] = nevents
+    for cut, nevents in category_metadata["cutflow"].items():
+        if cut != "initial":
+            cutflow[cut] = nevents
+    return cutflow
+
+
+def label_preselection_cuts(cutflow_df, preselection: list):
+    """label the preselection rows of a cutflow table (MC yields weighted only with genWeight)"""
+    return cutflow_df.rename(
+        index={cut: f"{cut} (MC: genWeight only)" for cut in preselection}
+    )
+
+
 def format_cutflow_with_efficiency(events_df, eff_df):
     combined = pd.DataFrame(index=events_df.index, columns=events_df.columns)
     for col in events_df.columns:
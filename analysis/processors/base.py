@@ -1,16 +1,24 @@
 import numpy as np
 import awkward as ak
-from copy import deepcopy
 from coffea import processor
 from coffea.nanoevents import NanoAODSchema
 from coffea.analysis_tools import Weights, PackedSelection
 from coffea.nanoevents.methods.vector import LorentzVector
-from analysis.utils import dump_lumi
+from analysis.utils import dump_lumi, StageProfiler, MemoryBudgetExceeded
 from analysis.workflows.config import WorkflowConfigBuilder
-from analysis.histograms import HistBuilder, fill_histograms
+from analysis.histograms import (
+    LazyHistograms,
+    get_histogram_templates,
+    BinIndexCache,
+    fill_histograms,
+)
 from analysis.corrections.correction_manager import (
     object_corrector_manager,
-    weight_manager,
+    chunk_weight_manager,
+)
+from analysis.corrections.correction_registry import (
+    preload_correction_sets,
+    get_correction_stats,
 )
 from analysis.selections import (
     ObjectSelector,
@@ -20,6 +28,7 @@ from analysis.selections import (
     get_metfilters_mask,
     get_trigger_match_mask,
     get_stitching_mask,
+    get_cutflow,
 )
 
 
@@ -27,26 +36,75 @@ NanoAODSchema.warn_missing_crossrefs = False
 
 
 class BaseProcessor(processor.ProcessorABC):
-    def __init__(self, workflow: str, year: str):
+    def __init__(
+        self,
+        workflow: str,
+        year: str,
+        max_memory: float = None,
+        nominal_only: bool = False,
+    ):
         self.year = year
+        # memory budget (MB) per process
+        self.max_memory = max_memory
+        # quick-look mode: skip the systematic variations of the event weights
+        self.nominal_only = nominal_only
         config_builder = WorkflowConfigBuilder(workflow)
         self.workflow_config = config_builder.build_workflow_config()
         self.histogram_config = self.workflow_config.histogram_config
-        self.histograms = HistBuilder(self.workflow_config).build_histogram()
+        if self.nominal_only:
+            self.histogram_config.variations = ["nominal"]
+        self.expressions = self.workflow_config.expressions
+        # selections used by the categories (plus the lumimask used to dump lumis)
+        event_selection = self.workflow_config.event_selection
+        self.selections = ["lumimask"] if "lumimask" in event_selection["selections"] else []
+        for category_cuts in event_selection["categories"].values():
+            for cut in category_cuts:
+                if cut not in self.selections:
+                    self.selections.append(cut)
+        # event-only cuts applied before object corrections
+        self.preselection = event_selection.get("preselection", [])
+        # objects needed by the selections, histograms and lepton weights
+        self.required_objects = set()
+        for selection in self.selections:
+            self.required_objects |= self.expressions["event_selection"][selection].objects
+        for expression in self.expressions["histogram_axes"].values():
+            self.required_objects |= expression.objects
+        weights_config = self.workflow_config.corrections_config["event_weights"]
+        for weight, obj_name in [("muon", "muons"), ("electron", "electrons")]:
+            if weight in weights_config and obj_name in self.expressions["object_selection"]:
+                self.required_objects.add(obj_name)
 
     def process(self, events):
+        try:
+            return self.process_events(events)
+        except MemoryBudgetExceeded as error:
+            # coffea re-raises the exceptions of the worker processes as a generic
+            # exception without their cause, so the budget error is returned in the
+            # output metadata (see submit.py)
+            return {"metadata": {"memory_budget_exceeded": [str(error)]}}
+
+    def process_events(self, events):
         year = self.year
         dataset = events.metadata["dataset"]
 
-        object_selections = self.workflow_config.object_selection
+        object_selections = self.expressions["object_selection"]
+        selection_expressions = self.expressions["event_selection"]
         event_selection = self.workflow_config.event_selection
         hlt_paths = event_selection["hlt_paths"]
-        histograms = deepcopy(self.histograms)
+        # histograms are allocated from the templates when they are first filled.
+        # Templates are built once per worker process instead of being pickled with
+        # the processor
+        histograms = LazyHistograms(get_histogram_templates(self.workflow_config))
 
         # check if dataset is MC or Data
         is_mc = hasattr(events, "genWeight")
-        if not is_mc:
-            events["Jet", "hadronFlavour"] = ak.zeros_like(events.Jet.pt)
+
+        # correction sets are parsed once per worker process (later chunks skip the
+        # preload, so the registry counters only count the lookups of the corrections)
+        preload_correction_sets(
+            year, self.workflow_config.corrections_config, is_mc=is_mc
+        )
+        correction_stats = get_correction_stats()
 
         # initialize output dictionary
         output = {}
@@ -55,102 +113,228 @@ class BaseProcessor(processor.ProcessorABC):
         output["metadata"] = {}
         sumw = ak.sum(events.genWeight) if is_mc else len(events)
         output["metadata"].update({"sumw": sumw})
+        if self.nominal_only:
+            # used by the postprocessor to build nominal-only histogram templates
+            output["metadata"]["nominal_only"] = True
+        nevents = len(events)
+        # add wall/CPU time and number of events of each stage to metadata
+        profiler = StageProfiler(max_memory=self.max_memory)
+        output["metadata"]["profile"] = profiler.profile
+
+        if not is_mc:
+            # save (run, luminosityBlock) pairs to metadata
+            lumi_mask = eval(selection_expressions["lumimask"].code)
+            dump_lumi(events[lumi_mask], output)
+
+        # --------------------------------------------------------------
+        # Preselection
+        # --------------------------------------------------------------
+        # apply event-only cuts before any correction or object selection
+        categories = event_selection["categories"]
+        with profiler.stage("preselection", nevents) as stage:
+            preselection_manager = PackedSelection()
+            for selection in self.preselection:
+                preselection_manager.add(
+                    selection, eval(selection_expressions[selection].code)
+                )
+            # preselection cutflow is computed on the full chunk, using generator weights
+            # since the remaining event weights need corrected objects. It is saved
+            # apart from the (fully weighted) cutflow of the remaining cuts
+            preselection_cutflows = {}
+            for category, category_cuts in categories.items():
+                preselection_cutflows[category] = get_cutflow(
+                    preselection_manager,
+                    category_cuts[: len(self.preselection)],
+                    events.genWeight if is_mc else np.ones(nevents),
+                )
+            if self.preselection:
+                events = events[preselection_manager.all(*self.preselection)]
+            stage["events_out"] = len(events)
+        if len(events) == 0:
+            for category, category_cuts in categories.items():
+                preselection_cutflow, raw_cutflow = preselection_cutflows[category]
+                cutflow = {cut: 0.0 for cut in category_cuts}
+                for cut in category_cuts:
+                    raw_cutflow.setdefault(cut, 0)
+                self.add_cutflow_metadata(
+                    output,
+                    category,
+                    sumw,
+                    nevents,
+                    cutflow,
+                    raw_cutflow,
+                    preselection_cutflow,
+                )
+            output["histograms"] = {}
+            return output
+
+        if not is_mc:
+            events["Jet", "hadronFlavour"] = ak.zeros_like(events.Jet.pt)
 
         # --------------------------------------------------------------
         # Object corrections
         # --------------------------------------------------------------
-        object_corrector_manager(
-            events=events,
-            year=year,
-            dataset=dataset,
-            workflow_config=self.workflow_config,
-        )
+        with profiler.stage("object_corrections", len(events)):
+            object_corrector_manager(
+                events=events,
+                year=year,
+                dataset=dataset,
+                workflow_config=self.workflow_config,
+                profiler=profiler,
+            )
 
         # --------------------------------------------------------------
         # Object selection
         # --------------------------------------------------------------
-        object_selector = ObjectSelector(object_selections, year)
-        objects = object_selector.select_objects(events)
+        with profiler.stage("object_selection", len(events)) as stage:
+            object_selector = ObjectSelector(
+                object_selections, year, required_objects=self.required_objects
+            )
+            objects = object_selector.select_objects(events)
+            stage["arrays"] = objects
 
         # --------------------------------------------------------------
         # Event selection
         # --------------------------------------------------------------
-        if not is_mc:
-            # save (run, luminosityBlock) pairs to metadata
-            lumi_mask = eval(event_selection["selections"]["lumimask"])
-            dump_lumi(events[lumi_mask], output)
+        with profiler.stage("event_selection", len(events)) as stage:
+            # initialize selection manager
+            selection_manager = PackedSelection()
+            # add the selections used by the categories to selector manager
+            for selection in self.selections:
+                selection_manager.add(
+                    selection, eval(selection_expressions[selection].code)
+                )
+            # get selection mask by category
+            category_masks = {}
+            for category, category_cuts in categories.items():
+                category_masks[category] = selection_manager.all(*category_cuts)
+            stage["events_out"] = int(np.sum(np.any(list(category_masks.values()), axis=0)))
+            stage["arrays"] = category_masks
 
-        # initialize selection manager
-        selection_manager = PackedSelection()
-        # add all selections to selector manager
-        for selection, mask in event_selection["selections"].items():
-            selection_manager.add(selection, eval(mask))
+        # --------------------------------------------------------------
+        # Event weights
+        # --------------------------------------------------------------
+        # add each selected object to 'events' as a new field
+        for obj in objects:
+            events[f"selected_{obj}"] = objects[obj]
+        # compute events weights once for the events entering any category cutflow
+        weights_mask = np.zeros(len(events), dtype=bool)
+        for category_cuts in categories.values():
+            weights_mask = weights_mask | selection_manager.all(category_cuts[0])
+        with profiler.stage("weights", int(np.sum(weights_mask))) as stage:
+            chunk_weights = chunk_weight_manager(
+                events=events,
+                mask=weights_mask,
+                year=year,
+                dataset=dataset,
+                workflow_config=self.workflow_config,
+                variation="nominal_only" if self.nominal_only else "nominal",
+            )
+            stage["arrays"] = {"nominal_weights": chunk_weights.weight()}
 
         # --------------------------------------------------------------
-        # Histogram filling
+        # Cutflow
         # --------------------------------------------------------------
-        categories = event_selection["categories"]
-        for category, category_cuts in categories.items():
-            # get selection mask by category
-            category_mask = selection_manager.all(*category_cuts)
-            nevents_after = ak.sum(category_mask)
-            if nevents_after > 0:
-                # get pruned events
-                pruned_ev = events[category_mask]
-                # add each selected object to 'pruned_ev' as a new field
-                for obj in objects:
-                    pruned_ev[f"selected_{obj}"] = objects[obj][category_mask]
-                # get weights container
-                weights_container = weight_manager(
-                    pruned_ev=pruned_ev,
-                    year=year,
-                    dataset=dataset,
-                    workflow_config=self.workflow_config,
+        with profiler.stage("cutflow", len(events)):
+            for category, category_cuts in categories.items():
+                cutflow, raw_cutflow = get_cutflow(
+                    selection_manager, category_cuts, chunk_weights.weight()
                 )
-                # save cutflow to metadata
-                output["metadata"][category] = {"cutflow": {"initial": sumw}}
-                selections = []
-                for cut_name in category_cuts:
-                    selections.append(cut_name)
-                    current_selection = selection_manager.all(*selections)
-                    pruned_ev_cutflow = events[current_selection]
-                    for obj in objects:
-                        pruned_ev_cutflow[f"selected_{obj}"] = objects[obj][current_selection]
-                    weights_container_cutflow = weight_manager(
-                        pruned_ev=pruned_ev_cutflow,
-                        year=year,
-                        dataset=dataset,
-                        workflow_config=self.workflow_config,
-                    )
-                    output["metadata"][category]["cutflow"][cut_name] = ak.sum(
-                        weights_container_cutflow.weight()
-                    )
-
-                # save number of events after selection to metadata
-                weighted_final_nevents = ak.sum(weights_container.weight())
-                output["metadata"][category].update(
-                    {
-                        "weighted_final_nevents": weighted_final_nevents,
-                        "raw_final_nevents": nevents_after,
-                    }
+                # raw yields of the preselection cuts are taken from the full chunk
+                preselection_cutflow, preselection_raw_cutflow = preselection_cutflows[
+                    category
+                ]
+                raw_cutflow.update(preselection_raw_cutflow)
+                self.add_cutflow_metadata(
+                    output,
+                    category,
+                    sumw,
+                    nevents,
+                    cutflow,
+                    raw_cutflow,
+                    preselection_cutflow,
                 )
-                # get analysis variables and fill histograms
+
+        # --------------------------------------------------------------
+        # Histogram filling
+        # --------------------------------------------------------------
+        nevents_selected = int(sum(np.sum(mask) for mask in category_masks.values()))
+        with profiler.stage("histogram_fill", nevents_selected) as stage:
+            stage["arrays"] = histograms
+            if nevents_selected > 0:
+                # evaluate the analysis variables once for the whole chunk. Their bin
+                # indices are computed once and shared by all layouts and categories
                 variables_map = {}
-                for variable, axis in self.histogram_config.axes.items():
-                    variables_map[variable] = eval(axis.expression)[category_mask]
-                fill_histograms(
-                    histogram_config=self.histogram_config,
-                    weights_container=weights_container,
-                    variables_map=variables_map,
-                    histograms=histograms,
-                    variation="nominal",
-                    category=category,
-                    is_mc=is_mc,
-                    flow=True,
+                for variable, expression in self.expressions["histogram_axes"].items():
+                    variables_map[variable] = eval(expression.code)
+                bin_indices = BinIndexCache(
+                    self.histogram_config, variables_map, flow=True
                 )
-        # add histograms to output dictionary
-        output["histograms"] = histograms
+            for category, category_mask in category_masks.items():
+                nevents_after = ak.sum(category_mask)
+                if nevents_after > 0:
+                    # get category view of the chunk weights
+                    weights_container = chunk_weights.category_view(category_mask)
+                    fill_histograms(
+                        histogram_config=self.histogram_config,
+                        weights_container=weights_container,
+                        bin_indices=bin_indices,
+                        histograms=histograms,
+                        category=category,
+                        category_mask=category_mask,
+                        is_mc=is_mc,
+                    )
+        # add correction set cache hits/misses of this chunk to metadata
+        output["metadata"]["correction_sets"] = {
+            counter: get_correction_stats()[counter] - correction_stats[counter]
+            for counter in ["hits", "misses"]
+        }
+        # add filled histograms to output dictionary
+        output["histograms"] = dict(histograms)
         return output
 
+    def add_cutflow_metadata(
+        self,
+        output,
+        category,
+        sumw,
+        nevents,
+        cutflow,
+        raw_cutflow,
+        preselection_cutflow,
+    ):
+        """
+        save weighted and raw cutflows and final number of events to metadata. The
+        weighted 'cutflow' only has the cuts applied after the preselection, with the
+        full event weights. The preselection cuts (weighted with the generator weights
+        for MC) are saved in 'preselection_cutflow'
+        """
+        category_cuts = self.workflow_config.event_selection["categories"][category]
+        npreselection = len(self.preselection)
+        output["metadata"][category] = {
+            "cutflow": {
+                "initial": sumw,
+                **{cut: cutflow[cut] for cut in category_cuts[npreselection:]},
+            },
+            "raw_cutflow": {
+                "initial": nevents,
+                **{cut: raw_cutflow[cut] for cut in category_cuts},
+            },
+            "weighted_final_nevents": cutflow[category_cuts[-1]],
+            "raw_final_nevents": raw_cutflow[category_cuts[-1]],
+        }
+        if self.preselection:
+            output["metadata"][category]["preselection_cutflow"] = {
+                "initial": sumw,
+                **{cut: preselection_cutflow[cut] for cut in category_cuts[:npreselection]},
+            }
+
     def postprocess(self, accumulator):
-        pass
+        # histograms are only allocated when first filled, so add the ones no chunk
+        # filled (empty), so every output has the full set of histograms
+        templates = get_histogram_templates(self.workflow_config)
+        histograms = accumulator.get("histograms", {})
+        accumulator["histograms"] = {
+            key: histograms[key] if key in histograms else templates.new(key)
+            for key in templates.axes
+        }
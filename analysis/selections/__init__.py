@@ -10,6 +10,7 @@ from analysis.selections.utils import (
     select_best_zzcandidate,
 )
 from analysis.selections.object_selections import ObjectSelector
+from analysis.selections.cutflow import get_cutflow
 import analysis.selections.event_selections as event_selections
 
 get_lumi_mask = event_selections.get_lumi_mask
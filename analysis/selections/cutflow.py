@@ -0,0 +1,34 @@
+import numpy as np
+
+
+def get_cutflow(selection_manager, cuts, weights):
+    """
+    compute the weighted and raw yields after each cumulative cut in a single pass
+
+    Parameters:
+    -----------
+        selection_manager:
+            PackedSelection object with all event selections
+        cuts:
+            ordered list of cuts defining a category
+        weights:
+            events weights (same length as the selections)
+
+    Returns:
+    --------
+        weighted and raw cutflows as {cut: yield} dictionaries
+    """
+    if not cuts:
+        return {}, {}
+    ncuts = len(cuts)
+    passed = np.stack([selection_manager.all(cut) for cut in cuts], axis=1)
+    # number of consecutive cuts passed by each event, starting from the first one
+    nleading = np.where(passed.all(axis=1), ncuts, np.argmin(passed, axis=1))
+    raw = np.bincount(nleading, minlength=ncuts + 1)
+    weighted = np.bincount(nleading, weights=np.asarray(weights), minlength=ncuts + 1)
+    # an event passing the first n cuts contributes to the yields of those n cuts
+    raw_yields = np.cumsum(raw[::-1])[::-1][1:]
+    weighted_yields = np.cumsum(weighted[::-1])[::-1][1:]
+    weighted_cutflow = {cut: float(weighted_yields[i]) for i, cut in enumerate(cuts)}
+    raw_cutflow = {cut: int(raw_yields[i]) for i, cut in enumerate(cuts)}
+    return weighted_cutflow, raw_cutflow
@@ -3,6 +3,7 @@ import awkward as ak
 from coffea.nanoevents.methods import candidate
 from coffea.nanoevents.methods.vector import LorentzVector
 from analysis.working_points import working_points
+from analysis.workflows.config.expressions import Expression
 from analysis.selections import (
     delta_r_higher,
     delta_r_lower,
@@ -16,20 +17,108 @@ from analysis.selections import (
 )
 
 
-class ObjectSelector:
+def depends_on(*object_names, modifies=False):
+    """
+    declare the objects read by an ObjectSelector method. If 'modifies' is True, the method
+    also updates those objects in place and it is run whenever any of them is selected
+    """
+
+    def decorator(method):
+        method.depends_on = set(object_names)
+        method.modifies = modifies
+        return method
+
+    return decorator
 
-    def __init__(self, object_selection_config, year):
+
+class ObjectSelector:
+    """
+    Parameters:
+    -----------
+        object_selection_config:
+            compiled object selection config (see analysis.workflows.config.expressions)
+        year:
+            year of the dataset
+        required_objects:
+            objects needed downstream (event selections, histograms, weights). Only these
+            objects and the ones they depend on are selected. If None, all objects are selected
+    """
+
+    def __init__(self, object_selection_config, year, required_objects=None):
         self.object_selection_config = object_selection_config
         self.year = year
+        self.dependencies = {}
+        for obj_name in self.object_selection_config:
+            self.dependencies[obj_name] = self.get_dependencies(obj_name)
+        self.objects_to_select = self.get_objects_to_select(required_objects)
+
+    def get_dependencies(self, obj_name):
+        """return the objects used to select 'obj_name'"""
+        obj_config = self.object_selection_config[obj_name]
+        if isinstance(obj_config["field"], Expression):
+            dependencies = set(obj_config["field"].objects)
+        else:
+            selection_function = getattr(self, obj_config["field"])
+            # methods without declared dependencies may use any previous object
+            dependencies = getattr(
+                selection_function, "depends_on", set(self.dependencies)
+            )
+        cuts = list(obj_config.get("cuts", []))
+        for add_cuts in obj_config.get("add_cut", {}).values():
+            cuts += add_cuts
+        for cut in cuts:
+            dependencies = dependencies | cut.objects
+        dependencies = dependencies - {obj_name}
+        for dependency in dependencies:
+            if dependency not in self.object_selection_config:
+                raise ValueError(
+                    f"Object '{obj_name}' uses undefined object '{dependency}'"
+                )
+        return dependencies
+
+    def get_objects_to_select(self, required_objects):
+        """return the required objects and their dependencies in declaration order"""
+        if required_objects is None:
+            return list(self.object_selection_config)
+        selected = set()
+
+        def add_object(obj_name):
+            if obj_name not in self.object_selection_config:
+                raise ValueError(f"'{obj_name}' object has not been defined!")
+            if obj_name not in selected:
+                selected.add(obj_name)
+                for dependency in self.dependencies[obj_name]:
+                    add_object(dependency)
+
+        for obj_name in required_objects:
+            add_object(obj_name)
+        # methods that update their input objects in place must run whenever those
+        # objects are selected, so that every consumer sees the same updated objects
+        added = True
+        while added:
+            added = False
+            for obj_name, obj_config in self.object_selection_config.items():
+                if obj_name in selected or isinstance(obj_config["field"], Expression):
+                    continue
+                selection_function = getattr(self, obj_config["field"])
+                if getattr(selection_function, "modifies", False) and (
+                    self.dependencies[obj_name] & selected
+                ):
+                    add_object(obj_name)
+                    added = True
+        return [
+            obj_name for obj_name in self.object_selection_config if obj_name in selected
+        ]
 
     def select_objects(self, events):
         self.objects = {}
         self.events = events
 
-        for obj_name, obj_config in self.object_selection_config.items():
+        for obj_name in self.objects_to_select:
+            obj_config = self.object_selection_config[obj_name]
             # check if object is defined from events or user defined function
-            if "events" in obj_config["field"]:
-                self.objects[obj_name] = eval(obj_config["field"])
+            if isinstance(obj_config["field"], Expression):
+                self.objects[obj_name] = eval(obj_config["field"].code)
             else:
                 selection_function = getattr(self, obj_config["field"])
                 selection_function(obj_name)
@@ -55,19 +144,21 @@ class ObjectSelector:
         # initialize selection mask
         selection_mask = ak.ones_like(self.objects[obj_name].pt, dtype=bool)
         # iterate over all cuts
-        for str_mask in cuts:
-            mask = eval(str_mask)
+        for cut in cuts:
+            mask = eval(cut.code)
             selection_mask = np.logical_and(selection_mask, mask)
         return selection_mask
 
     # --------------------------------------------------------------------------------
     # ZToLL
     # --------------------------------------------------------------------------------
+    @depends_on("muons")
     def select_dimuons(self, obj_name):
         if "muons" not in self.objects:
             raise ValueError(f"'muons' object has not been defined!")
         self.objects[obj_name] = select_dileptons(self.objects, "muons")
 
+    @depends_on("electrons")
     def select_dielectrons(self, obj_name):
         if "electrons" not in self.objects:
             raise ValueError(f"'electrons' object has not been defined!")
@@ -76,6 +167,7 @@ class ObjectSelector:
     # --------------------------------------------------------------------------------
     # ZZTo4L (Z+L, ZLL)
     # --------------------------------------------------------------------------------
+    @depends_on("muons", "electrons", "fsr_photons", modifies=True)
     def select_zzto4l_leptons(self, obj_name):
         muons = self.objects["muons"]
         muons["lostHits"] = ak.zeros_like(muons.pt)
@@ -240,6 +332,7 @@ class ObjectSelector:
         )
         self.objects[obj_name] = leptons
 
+    @depends_on("leptons")
     def select_zcandidates(self, obj_name):
         """selects Z candidates for SR and all CRS"""
         # get Z candidates
@@ -253,6 +346,7 @@ class ObjectSelector:
         # add the Z candidates to objects
         self.objects[obj_name] = zcand
 
+    @depends_on("zcandidates")
     def select_best_zcandidate(self, obj_name):
         """selects best Z candidate as the one closest to the nominal Z mass"""
         zmass = 91.1876
@@ -264,6 +358,7 @@ class ObjectSelector:
         ]
         self.objects[obj_name] = best_zcand
 
+    @depends_on("best_zcandidates", "leptons")
     def select_other_relaxed_leptons(self, obj_name):
         """
         selects additional relaxed leptons in the Z+L CR. Adds the mask 'pass_selection' to additional relaxed leptons that pass the analysis selection
@@ -337,6 +432,7 @@ class ObjectSelector:
         # add relaxed leptons to objects
         self.objects[obj_name] = relaxed_leptons
 
+    @depends_on("best_zcandidates", "other_relaxed_leptons")
     def select_trilepton(self, obj_name):
         self.objects[obj_name] = (
             self.objects["best_zcandidates"].l1
@@ -344,40 +440,47 @@ class ObjectSelector:
             + ak.firsts(self.objects["other_relaxed_leptons"])
         )
 
+    @depends_on("zcandidates")
     def select_zzcandidates(self, obj_name):
         """selects ZZ candidates for SR and CRs"""
         self.objects[obj_name] = make_cand(
             self.objects["zcandidates"], kind="zz", sort_by_mass=True
         )
 
+    @depends_on("zcandidates")
     def select_zllcandidates_os(self, obj_name):
         """selects Zll candidates for CRs"""
         self.objects[obj_name] = make_cand(
             self.objects["zcandidates"], kind="zll", sort_by_mass=False, os_method=True
         )
 
+    @depends_on("zcandidates")
     def select_zllcandidates_ss(self, obj_name):
         """selects Zll candidates for CRs"""
         self.objects[obj_name] = make_cand(
             self.objects["zcandidates"], kind="zll", sort_by_mass=False, os_method=False
         )
 
+    @depends_on("zzcandidates")
     def select_best_zzcandidate(self, obj_name):
         """selects best ZZ candidates for SR"""
         self.objects[obj_name] = select_best_zzcandidate(self.objects["zzcandidates"])
 
+    @depends_on("zllcandidates")
     def select_best_1fcr_zllcandidate(self, obj_name):
         """selects best Zll candidates for 3P1F CR"""
         self.objects[obj_name] = select_best_zzcandidate(
             self.objects["zllcandidates"], "is_1fcr"
         )
 
+    @depends_on("zllcandidates")
     def select_best_2fcr_zllcandidate(self, obj_name):
         """selects best Zll candidates for 2P2F CR"""
         self.objects[obj_name] = select_best_zzcandidate(
             self.objects["zllcandidates"], "is_2fcr"
         )
 
+    @depends_on("zllcandidates")
     def select_best_sscr_zllcandidate(self, obj_name):
         """selects best Zll candidates for SS CR"""
         self.objects[obj_name] = select_best_zzcandidate(
@@ -387,6 +490,7 @@ class ObjectSelector:
     # --------------------------------------------------------------------------------
     # HWW
     # --------------------------------------------------------------------------------
+    @depends_on("muons", "electrons")
     def select_hww_leptons(self, obj_name):
         # set 'leptons' by concatenating electrons and muons
         leptons = ak.concatenate(
@@ -406,32 +510,37 @@ class ObjectSelector:
             behavior=candidate.behavior,
         )
 
+    @depends_on("leptons")
     def select_hww_zcandidates(self, obj_name):
-        self.objects["zcandidates"] = ak.combinations(
+        self.objects[obj_name] = ak.combinations(
             self.objects["leptons"], 2, fields=["l1", "l2"]
         )
-        self.objects["zcandidates"].pt = (
-            self.objects["zcandidates"].l1.pt + self.objects["zcandidates"].l2.pt
+        self.objects[obj_name].pt = (
+            self.objects[obj_name].l1.pt + self.objects[obj_name].l2.pt
         )
 
+    @depends_on("zcandidates", "met")
     def select_hww_mll(self, obj_name):
-        self.objects["mll"] = transverse_mass(
+        self.objects[obj_name] = transverse_mass(
             self.objects["zcandidates"].l1 + self.objects["zcandidates"].l2,
             self.objects["met"],
         )
 
+    @depends_on("zcandidates", "met")
     def select_hww_ml1(self, obj_name):
-        self.objects["ml1"] = transverse_mass(
+        self.objects[obj_name] = transverse_mass(
             self.objects["zcandidates"].l1, self.objects["met"]
         )
 
+    @depends_on("zcandidates", "met")
     def select_hww_ml2(self, obj_name):
-        self.objects["ml2"] = transverse_mass(
+        self.objects[obj_name] = transverse_mass(
             self.objects["zcandidates"].l2, self.objects["met"]
         )
 
+    @depends_on("cjets")
     def select_candidate_cjet(self, obj_name):
-        self.objects["candidate_cjet"] = self.objects["cjets"][
+        self.objects[obj_name] = self.objects["cjets"][
             ak.argmax(self.objects["cjets"].btagDeepFlavCvL, axis=1)
             == ak.local_index(self.objects["cjets"], axis=1)
         ]
@@ -1,3 +1,8 @@
 from analysis.utils.output_dir_maker import make_output_directory
 from analysis.utils.root_writer import write_root
-from analysis.utils.lumi import dump_lumi
\ No newline at end of file
+from analysis.utils.lumi import dump_lumi
+from analysis.utils.profiler import (
+    StageProfiler,
+    MemoryBudgetExceeded,
+    get_profile_table,
+)
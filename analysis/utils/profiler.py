@@ -0,0 +1,142 @@
+import os
+import time
+import resource
+import numpy as np
+import awkward as ak
+from contextlib import contextmanager
+
+
+class Peak(float):
+    """float whose addition keeps the maximum, so it accumulates as a high-water mark"""
+
+    def __add__(self, other):
+        return Peak(max(self, other))
+
+    __radd__ = __add__
+
+
+class MemoryBudgetExceeded(RuntimeError):
+    """raised when the process memory exceeds the budget set with 'max_memory'"""
+
+
+def get_rss() -> float:
+    """return the current resident set size of the process in MB"""
+    try:
+        with open("/proc/self/statm") as f:
+            rss_pages = int(f.read().split()[1])
+        return rss_pages * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError):
+        # fall back to the peak RSS where /proc is not available
+        return get_max_rss()
+
+
+def get_max_rss() -> float:
+    """return the peak resident set size of the process in MB"""
+    # ru_maxrss is given in kB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+
+
+def get_nbytes(obj) -> int:
+    """return the size in bytes of the (materialized) buffers of an array or histogram"""
+    if isinstance(obj, ak.Array):
+        return obj.layout.nbytes
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if hasattr(obj, "nbytes"):
+        # sparse histograms
+        return obj.nbytes
+    if hasattr(obj, "view"):
+        return obj.view(flow=True).nbytes
+    return 0
+
+
+class StageProfiler:
+    """
+    Record wall time, CPU time, number of input/output events and memory high-water
+    marks for each processing stage. 'profile' is a {stage: {field: value}} dictionary
+    that can be added to the output metadata, where it is accumulated across chunks and
+    jobs by coffea's accumulate (times and events are summed, memory fields keep the peak)
+
+    Parameters:
+    -----------
+        max_memory:
+            memory budget in MB. If the RSS exceeds it at the end of a stage a
+            MemoryBudgetExceeded exception is raised
+    """
+
+    def __init__(self, max_memory: float = None):
+        self.profile = {}
+        self.max_memory = max_memory
+
+    @contextmanager
+    def stage(self, name: str, events_in: int):
+        """
+        time the code within the context as the stage 'name'. The yielded dictionary
+        can be used to set the number of events leaving the stage (default 'events_in')
+        and the arrays produced by the stage ('arrays': {name: array}), whose sizes are
+        sampled at the end of the stage
+        """
+        record = {"events_in": events_in, "events_out": events_in, "arrays": {}}
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            stage_profile = self.profile.setdefault(
+                name,
+                {
+                    "wall_time": 0.0,
+                    "cpu_time": 0.0,
+                    "events_in": 0,
+                    "events_out": 0,
+                    "rss_mb": Peak(0),
+                    "max_rss_mb": Peak(0),
+                    "arrays_mb": {},
+                },
+            )
+            stage_profile["wall_time"] += time.perf_counter() - wall_start
+            stage_profile["cpu_time"] += time.process_time() - cpu_start
+            stage_profile["events_in"] += record["events_in"]
+            stage_profile["events_out"] += record["events_out"]
+            stage_profile["rss_mb"] += Peak(get_rss())
+            stage_profile["max_rss_mb"] += Peak(get_max_rss())
+            for array_name, array in record["arrays"].items():
+                stage_profile["arrays_mb"][array_name] = stage_profile["arrays_mb"].get(
+                    array_name, Peak(0)
+                ) + Peak(get_nbytes(array) / 1e6)
+        self.check_memory_budget(name, events_in)
+
+    def check_memory_budget(self, name: str, nevents: int):
+        if self.max_memory is None:
+            return
+        rss = get_rss()
+        if rss > self.max_memory:
+            largest = sorted(
+                self.profile[name]["arrays_mb"].items(), key=lambda item: -item[1]
+            )[:5]
+            raise MemoryBudgetExceeded(
+                f"RSS of {rss:.0f} MB exceeds the memory budget of {self.max_memory:.0f} MB "
+                f"after stage '{name}' ({nevents} events in). "
+                f"Largest arrays [MB]: {dict((k, round(v, 1)) for k, v in largest)}"
+            )
+
+
+def get_profile_table(profile: dict):
+    """return a pandas DataFrame with the accumulated profile of each stage"""
+    import pandas as pd
+
+    table = pd.DataFrame.from_dict(profile, orient="index")
+    columns = ["wall_time", "cpu_time", "events_in", "events_out"]
+    table["events/s"] = table["events_in"] / table["wall_time"]
+    # sub-stages ('stage/substage') are already included in their parent stage
+    top_level = ~table.index.str.contains("/")
+    table["wall_fraction"] = table["wall_time"] / table["wall_time"][top_level].sum()
+    columns += ["events/s", "wall_fraction"]
+    if "rss_mb" in table:
+        columns += ["rss_mb", "max_rss_mb", "largest_array", "largest_array_mb"]
+        table["largest_array"] = [
+            max(arrays, key=arrays.get) if arrays else "" for arrays in table["arrays_mb"]
+        ]
+        table["largest_array_mb"] = [
+            max(arrays.values()) if arrays else 0.0 for arrays in table["arrays_mb"]
+        ]
+    return table[columns].astype({"events_in": int, "events_out": int})
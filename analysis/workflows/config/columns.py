@@ -0,0 +1,122 @@
+import ast
+from analysis.workflows.config.expressions import Expression
+
+# NanoAOD columns read by the processor itself (sumw, lumi dump, data jets flavour)
+PROCESSOR_COLUMNS = ["genWeight", "run", "luminosityBlock", "Jet"]
+
+# NanoAOD columns of the event identifiers that seed the correction random numbers
+# (see analysis/corrections/rng.py)
+RNG_COLUMNS = ["run", "luminosityBlock", "event"]
+
+# NanoAOD columns read by each correction of the workflow 'corrections' config
+CORRECTION_COLUMNS = {
+    "objects": {
+        "jets": ["Jet", "GenJet", "Rho_fixedGridRhoFastjetAll"],
+        "muons": ["Muon", "PuppiMET", *RNG_COLUMNS],
+        "electrons": ["Electron", *RNG_COLUMNS],
+        "met": ["PuppiMET", "PV_npvsGood", *RNG_COLUMNS],
+    },
+    "event_weights": {
+        "genWeight": ["genWeight"],
+        "pileupWeight": ["Pileup_nTrueInt"],
+        "partonshowerWeight": ["PSWeight"],
+        "lhepdfWeight": ["LHEPdfWeight"],
+        "lhescaleWeight": ["LHEScaleWeight"],
+        "nnlopsWeight": ["HTXS_Higgs_pt", "HTXS_njets30"],
+        # lepton weights only use the selected objects
+        "muon": [],
+        "electron": [],
+    },
+}
+
+# NanoAOD columns read by the helpers that receive 'events' in the workflow expressions
+HELPER_COLUMNS = {
+    "get_lumi_mask": ["run", "luminosityBlock"],
+    "get_trigger_mask": ["HLT"],
+    "get_zzto4l_trigger_mask": ["HLT"],
+    "get_trigger_match_mask": ["HLT", "TrigObj"],
+    "get_metfilters_mask": ["Flag"],
+    "get_stitching_mask": ["LHE_HT"],
+    "jet_id": ["Jet"],
+    "jet_particlenet_c": ["Jet"],
+    "jet_particlenet_b": ["Jet"],
+    "electron_id": ["Electron"],
+    "electron_iso": ["Electron"],
+    "muon_id": ["Muon"],
+    "muon_iso": ["Muon"],
+}
+
+
+def get_expression_columns(source: str) -> set:
+    """
+    return the NanoAOD columns read by a workflow expression: 'events.Muon' reads the
+    whole Muon collection while 'events.PV.npvsGood' only reads 'PV_npvsGood'
+    """
+    columns = set()
+    inner_nodes = set()
+    for node in ast.walk(ast.parse(source.strip(), mode="eval")):
+        if isinstance(node, ast.Call):
+            # helpers (get_lumi_mask, working_points.muon_id, ...) called with 'events'
+            if isinstance(node.func, ast.Attribute):
+                function_name = node.func.attr
+            elif isinstance(node.func, ast.Name):
+                function_name = node.func.id
+            else:
+                function_name = None
+            if function_name in HELPER_COLUMNS and any(
+                isinstance(arg, ast.Name) and arg.id == "events" for arg in node.args
+            ):
+                columns.update(HELPER_COLUMNS[function_name])
+        if isinstance(node, ast.Attribute) and node not in inner_nodes:
+            # get the full attribute chain, e.g. events.PV.npvsGood -> [PV, npvsGood]
+            chain = []
+            value = node
+            while isinstance(value, ast.Attribute):
+                chain.insert(0, value.attr)
+                inner_nodes.add(value)
+                value = value.value
+            if isinstance(value, ast.Name) and value.id == "events":
+                columns.add("_".join(chain[:2]))
+    # drop columns already covered by a full collection
+    return {
+        column
+        for column in columns
+        if not any(column != other and is_covered(column, [other]) for other in columns)
+    }
+
+
+def get_columns_manifest(workflow_config) -> set:
+    """return the NanoAOD collections and branches a workflow is expected to read"""
+    manifest = set(PROCESSOR_COLUMNS)
+    expressions = workflow_config.expressions
+    sources = [expression.source for expression in expressions["event_selection"].values()]
+    sources += [expression.source for expression in expressions["histogram_axes"].values()]
+    for object_config in expressions["object_selection"].values():
+        if isinstance(object_config["field"], Expression):
+            sources.append(object_config["field"].source)
+        sources += [cut.source for cut in object_config.get("cuts", [])]
+        for cuts in object_config.get("add_cut", {}).values():
+            sources += [cut.source for cut in cuts]
+    for source in sources:
+        manifest.update(get_expression_columns(source))
+    corrections_config = workflow_config.corrections_config
+    for correction in corrections_config["objects"]:
+        manifest.update(CORRECTION_COLUMNS["objects"][correction])
+    for weight, weight_config in corrections_config["event_weights"].items():
+        if weight_config:
+            manifest.update(CORRECTION_COLUMNS["event_weights"][weight])
+    return manifest
+
+
+def is_covered(branch: str, manifest) -> bool:
+    """check if a branch is covered by a manifest entry (the branch itself or its collection)"""
+    for column in manifest:
+        if branch in [column, f"n{column}"] or branch.startswith(f"{column}_"):
+            return True
+    return False
+
+
+def get_unexpected_columns(columns, manifest) -> list:
+    """return the branches read that are not covered by the columns manifest"""
+    return sorted(column for column in columns if not is_covered(column, manifest))
+
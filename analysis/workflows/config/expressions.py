@@ -0,0 +1,128 @@
+import ast
+
+
+def get_object_references(source: str) -> set:
+    """return the names of the objects referenced as objects['name'] in an expression"""
+    references = set()
+    for node in ast.walk(ast.parse(source.strip(), mode="eval")):
+        if (
+            isinstance(node, ast.Subscript)
+            and isinstance(node.value, ast.Name)
+            and node.value.id == "objects"
+            and isinstance(node.slice, ast.Constant)
+            and isinstance(node.slice.value, str)
+        ):
+            references.add(node.slice.value)
+    return references
+
+
+class Expression:
+    """
+    Workflow config expression compiled once when the config is built
+
+    Parameters:
+    -----------
+        source:
+            expression string as written in the workflow config
+        name:
+            location of the expression within the workflow config (used in error messages)
+
+    Attributes:
+    -----------
+        code:
+            compiled code object. It is evaluated with 'eval(expression.code)' in the scope
+            where the expression string used to be evaluated, so the same names ('events',
+            'objects', 'year', ...) are available to it
+        objects:
+            names of the objects referenced by the expression as objects['name']
+    """
+
+    def __init__(self, source: str, name: str):
+        if not isinstance(source, str):
+            raise TypeError(
+                f"Expression '{name}' must be a string, got {type(source).__name__}: {source!r}"
+            )
+        self.source = source
+        self.name = name
+        try:
+            self.code = compile(source.strip(), f"<{name}>", "eval")
+        except SyntaxError as error:
+            raise ValueError(
+                f"Invalid expression in '{name}': {source!r} ({error.msg})"
+            ) from error
+        self.objects = get_object_references(source)
+
+    def __reduce__(self):
+        # code objects are rebuilt from source when the processor is sent to the workers
+        return (Expression, (self.source, self.name))
+
+    def __repr__(self):
+        return f"Expression({self.source!r})"
+
+
+def compile_object_selection(object_selection: dict) -> dict:
+    """
+    compile object selection expressions. Returns a dictionary with the same structure
+    as 'object_selection' where every expression has been replaced by an Expression.
+    Fields defined through an ObjectSelector method keep the method name
+    """
+    compiled = {}
+    for object_name, object_config in object_selection.items():
+        field = object_config["field"]
+        compiled[object_name] = {
+            "field": (
+                Expression(field, f"object_selection.{object_name}.field")
+                if "events" in field
+                else field
+            )
+        }
+        if "cuts" in object_config:
+            compiled[object_name]["cuts"] = [
+                Expression(cut, f"object_selection.{object_name}.cuts[{i}]")
+                for i, cut in enumerate(object_config["cuts"])
+            ]
+        if "add_cut" in object_config:
+            compiled[object_name]["add_cut"] = {}
+            for cut_name, cuts in object_config["add_cut"].items():
+                compiled[object_name]["add_cut"][cut_name] = [
+                    Expression(cut, f"object_selection.{object_name}.add_cut.{cut_name}[{i}]")
+                    for i, cut in enumerate(cuts)
+                ]
+    return compiled
+
+
+def compile_event_selection(event_selection: dict) -> dict:
+    """compile event selection expressions. Returns a {selection: Expression} dictionary"""
+    compiled = {}
+    for selection, mask in event_selection["selections"].items():
+        compiled[selection] = Expression(mask, f"event_selection.selections.{selection}")
+    # check that categories only use defined selections
+    for category, category_cuts in event_selection["categories"].items():
+        for cut_name in category_cuts:
+            if cut_name not in compiled:
+                raise ValueError(
+                    f"Category '{category}' uses undefined selection '{cut_name}'"
+                )
+    # check that preselection cuts only use events and lead every category
+    preselection = event_selection.get("preselection", [])
+    for cut_name in preselection:
+        if cut_name not in compiled:
+            raise ValueError(f"Preselection uses undefined selection '{cut_name}'")
+        if compiled[cut_name].objects:
+            raise ValueError(
+                f"Preselection cut '{cut_name}' uses selected objects: {compiled[cut_name].source!r}"
+            )
+    for category, category_cuts in event_selection["categories"].items():
+        if set(category_cuts[: len(preselection)]) != set(preselection):
+            raise ValueError(
+                f"Category '{category}' must start with the preselection cuts {preselection}"
+            )
+    return compiled
+
+
+def compile_histogram_axes(histogram_config) -> dict:
+    """compile histogram axes expressions. Returns a {axis: Expression} dictionary"""
+    return {
+        name: Expression(axis.expression, f"histogram_config.axes.{name}.expression")
+        for name, axis in histogram_config.axes.items()
+    }
@@ -9,6 +9,8 @@ class WorkflowConfig:
         event_selection:
         corrections_config:
         histogram_config:
+        expressions:
+            compiled object selection, event selection and histogram axes expressions
     """
 
     def __init__(
@@ -17,11 +19,13 @@ class WorkflowConfig:
         event_selection,
         corrections_config,
         histogram_config,
+        expressions=None,
     ):
         self.object_selection = object_selection
         self.event_selection = event_selection
         self.corrections_config = corrections_config
         self.histogram_config = histogram_config
+        self.expressions = expressions
 
     def to_dict(self):
         """Convert WorkflowConfig to a dictionary."""
@@ -1,7 +1,13 @@
 import yaml
 import importlib.resources
 from analysis.histograms import HistogramConfig
+from analysis.corrections.weight_variations import get_weight_variations
 from .workflow_config import WorkflowConfig
+from .expressions import (
+    compile_object_selection,
+    compile_event_selection,
+    compile_histogram_axes,
+)
 
 
 class WorkflowConfigBuilder:
@@ -12,13 +18,27 @@ class WorkflowConfigBuilder:
             self.config = yaml.safe_load(file)
 
     def build_workflow_config(self):
+        object_selection = self.parse_object_selection()
+        event_selection = self.parse_event_selection()
+        histogram_config = self.parse_histogram_config()
         return WorkflowConfig(
-            object_selection=self.parse_object_selection(),
-            event_selection=self.parse_event_selection(),
+            object_selection=object_selection,
+            event_selection=event_selection,
             corrections_config=self.parse_corrections_config(),
-            histogram_config=self.parse_histogram_config(),
+            histogram_config=histogram_config,
+            expressions=self.compile_expressions(
+                object_selection, event_selection, histogram_config
+            ),
         )
 
+    def compile_expressions(self, object_selection, event_selection, histogram_config):
+        """compile all workflow expressions once, so syntax errors are raised at startup"""
+        return {
+            "object_selection": compile_object_selection(object_selection),
+            "event_selection": compile_event_selection(event_selection),
+            "histogram_axes": compile_histogram_axes(histogram_config),
+        }
+
     def parse_object_selection(self):
         object_selection = {}
         for object_name in self.config["object_selection"]:
@@ -45,6 +65,7 @@ class WorkflowConfigBuilder:
     def parse_histogram_config(self):
         hist_config = HistogramConfig(**self.config["histogram_config"])
         hist_config.categories = list(self.parse_event_selection()["categories"].keys())
+        hist_config.variations = get_weight_variations(self.parse_corrections_config())
         return hist_config
 
     def parse_corrections_config(self):
@@ -0,0 +1,64 @@
+import hist
+import numpy as np
+from analysis.histograms.bin_kernels import get_bin_indices
+
+
+AXES = [
+    hist.axis.Regular(10, 0.0, 5.0, name="regular"),
+    hist.axis.Regular(10, 0.0, 5.0, name="regular_noflow", underflow=False, overflow=False),
+    hist.axis.Variable([0.0, 1.0, 2.5, 5.0], name="variable"),
+    hist.axis.Variable([0.0, 1.0, 2.5, 5.0], name="variable_noflow", overflow=False),
+    hist.axis.Integer(0, 5, name="integer"),
+    hist.axis.Integer(0, 5, name="integer_noflow", underflow=False, overflow=False),
+    hist.axis.IntCategory([1, 3, 4], name="intcategory"),
+    hist.axis.IntCategory([1, 3, 4], name="intcategory_noflow", overflow=False),
+]
+VALUES = np.array([-np.inf, -7.0, -0.5, 0.0, 1.0, 2.5, 3.0, 4.99, 5.0, 7.0, np.inf])
+
+
+def expected_index(axis, value, flow):
+    """flow-inclusive bin index of 'value' from axis.index (None if not filled)"""
+    underflow = int(axis.traits.underflow)
+    if isinstance(axis, hist.axis.IntCategory):
+        if np.isfinite(value) and int(value) in list(axis):
+            return axis.index(int(value))
+        return axis.size if axis.traits.overflow else None
+    if isinstance(axis, hist.axis.Integer):
+        # integer axes only take integers: +-inf map to the values beyond the edges
+        if np.isinf(value):
+            value = axis.edges[-1] if value > 0 else axis.edges[0] - 1
+        index = axis.index(int(value))
+    else:
+        index = axis.index(value)
+    if flow:
+        index = min(max(index, 0), axis.size - 1)
+    index += underflow
+    if 0 <= index < axis.extent:
+        return index
+    return None
+
+
+def check_bin_kernels():
+    """compare the bin index kernels with axis.index, including +-inf values"""
+    mismatches = []
+    valid = np.ones(len(VALUES), dtype=bool)
+    for axis in AXES:
+        for flow in [False, True]:
+            if flow and isinstance(axis, (hist.axis.Integer, hist.axis.IntCategory)):
+                continue
+            indices, fill = get_bin_indices(axis, VALUES, valid, flow)
+            for value, index, filled in zip(VALUES, indices, fill):
+                expected = expected_index(axis, value, flow)
+                result = index if filled else None
+                if result != expected:
+                    mismatches.append((axis.name, flow, value, result, expected))
+    return mismatches
+
+
+if __name__ == "__main__":
+    mismatches = check_bin_kernels()
+    for name, flow, value, result, expected in mismatches:
+        print(f"{name} (flow={flow}): value {value} -> {result}, expected {expected}")
+    if mismatches:
+        raise ValueError(f"{len(mismatches)} bin indices differ from axis.index")
+    print(f"bin indices of {len(AXES)} axes match axis.index")
@@ -0,0 +1,253 @@
+import time
+import argparse
+import numpy as np
+import awkward as ak
+from pathlib import Path
+from scipy.special import erfinv, erf
+from analysis.corrections.correction_registry import get_correction_set
+from analysis.corrections.muon_ss import pt_resol, filter_boundaries
+
+
+# reference (awkward) implementation, taken from:
+# https://gitlab.cern.ch/cms-muonPOG/muonscarekit/-/blob/master/scripts/MuonScaRe.py?ref_type=heads
+class CrystallBall:
+
+    def __init__(self, m, s, a, n):
+        self.pi = 3.14159
+        self.sqrtPiOver2 = np.sqrt(self.pi / 2.0)
+        self.sqrt2 = np.sqrt(2.0)
+        self.m = ak.Array(m)
+        self.s = ak.Array(s)
+        self.a = ak.Array(a)
+        self.n = ak.Array(n)
+        self.fa = abs(self.a)
+        self.ex = np.exp(-self.fa * self.fa / 2)
+        self.A = (self.n / self.fa) ** self.n * self.ex
+        self.C1 = self.n / self.fa / (self.n - 1) * self.ex
+        self.D1 = 2 * self.sqrtPiOver2 * erf(self.fa / self.sqrt2)
+
+        self.B = self.n / self.fa - self.fa
+        self.C = (self.D1 + 2 * self.C1) / self.C1
+        self.D = (self.D1 + 2 * self.C1) / 2
+
+        self.N = 1.0 / self.s / (self.D1 + 2 * self.C1)
+        self.k = 1.0 / (self.n - 1)
+
+        self.NA = self.N * self.A
+        self.Ns = self.N * self.s
+        self.NC = self.Ns * self.C1
+        self.F = 1 - self.fa * self.fa / self.n
+        self.G = self.s * self.n / self.fa
+        self.cdfMa = self.cdf(self.m - self.a * self.s)
+        self.cdfPa = self.cdf(self.m + self.a * self.s)
+
+    def cdf(self, x):
+        x = ak.Array(x)
+        d = (x - self.m) / self.s
+        result = ak.full_like(d, 1.0)
+
+        # define different conditions
+        c1a = (d < -self.a) & (self.F - self.s * d / self.G > 0)
+        c1b = (d < -self.a) & (self.F - self.s * d / self.G <= 0)
+        c2a = (d > self.a) & (self.F + self.s * d / self.G > 0)
+        c2b = (d > self.a) & (self.F + self.s * d / self.G <= 0)
+
+        c3 = ~c1a & ~c1b & ~c2a & ~c2b
+        # For d < -a
+        result = ak.where(
+            c1a, self.NC / np.power(self.F - self.s * d / self.G, self.n - 1), result
+        )
+        result = ak.where(c1b, self.NC, result)
+
+        # For d > a
+        result = ak.where(
+            c2a,
+            self.NC * (self.C - np.power(self.F + self.s * d / self.G, 1 - self.n)),
+            result,
+        )
+        result = ak.where(c2b, self.NC * self.C, result)
+
+        # For -a <= d <= a
+        result = ak.where(
+            c3, self.Ns * (self.D - self.sqrtPiOver2 * erf(-d / self.sqrt2)), result
+        )
+
+        return result
+
+    def invcdf(self, u):
+        u = ak.Array(u)
+        result = ak.zeros_like(u)
+
+        c1a = (u < self.cdfMa) & (self.NC / u > 0)
+        c1b = (u < self.cdfMa) & (self.NC / u <= 0)
+        c2a = (u > self.cdfPa) & (self.C - u / self.NC > 0)
+        c2b = (u > self.cdfPa) & (self.C - u / self.NC <= 0)
+        c3 = ~c1a & ~c1b & ~c2a & ~c2b
+
+        # For u < cdfMa
+        result = ak.where(
+            c1a, self.m + self.G * (self.F - (self.NC / u) ** self.k), result
+        )
+        result = ak.where(c1b, self.m + self.G * self.F, result)
+
+        # For u > cdfPa
+        result = ak.where(
+            c2a,
+            self.m - self.G * (self.F - (self.C - u / self.NC) ** (-self.k)),
+            result,
+        )
+        result = ak.where(c2b, self.m - self.G * self.F, result)
+
+        # For cdfMa <= u <= cdfPa
+        result = ak.where(
+            c3,
+            self.m
+            - self.sqrt2 * self.s * erfinv((self.D - u / self.Ns) / self.sqrtPiOver2),
+            result,
+        )
+
+        return result
+
+
+def get_rndm(eta, nL, cset, rndm, nested=False):
+    """
+    rndm: flat array with one uniform random number in (0, 1) per muon (see
+    analysis.corrections.rng)
+    """
+    # obtain parameters from correctionlib
+    if nested:
+        eta_f, nL_f, nmuons = ak.flatten(eta), ak.flatten(nL), ak.num(nL)
+    else:
+        eta_f, nL_f, nmuons = eta, nL, np.ones_like(eta)
+
+    mean_f = cset.get("cb_params").evaluate(abs(eta_f), nL_f, 0)
+    sigma_f = cset.get("cb_params").evaluate(abs(eta_f), nL_f, 1)
+    n_f = cset.get("cb_params").evaluate(abs(eta_f), nL_f, 2)
+    alpha_f = cset.get("cb_params").evaluate(abs(eta_f), nL_f, 3)
+
+    # get random number following the CB
+    rndm_f = rndm
+
+    cb_f = CrystallBall(mean_f, sigma_f, alpha_f, n_f)
+
+    result_f = cb_f.invcdf(rndm_f)
+
+    if nested:
+        result = ak.unflatten(result_f, nmuons)
+    else:
+        result = result_f
+
+    return result
+
+
+def get_std(pt, eta, nL, cset, nested=False):
+    if nested:
+        eta_f, nL_f, pt_f, nmuons = (
+            ak.flatten(eta),
+            ak.flatten(nL),
+            ak.flatten(pt),
+            ak.num(nL),
+        )
+    else:
+        eta_f, nL_f, pt_f, nmuons = eta, nL, pt, 1
+
+    # obtain parameters from correctionlib
+    param0_f = cset.get("poly_params").evaluate(abs(eta_f), nL_f, 0)
+    param1_f = cset.get("poly_params").evaluate(abs(eta_f), nL_f, 1)
+    param2_f = cset.get("poly_params").evaluate(abs(eta_f), nL_f, 2)
+
+    # calculate value and return max(0, val)
+    sigma_f = param0_f + param1_f * pt_f + param2_f * pt_f * pt_f
+    sigma_corrected_f = np.where(sigma_f < 0, 0, sigma_f)
+
+    if nested:
+        result = ak.unflatten(sigma_corrected_f, nmuons)
+    else:
+        result = sigma_corrected_f
+
+    return result
+
+
+def get_k(eta, var, cset, nested=False):
+    if nested:
+        eta_f, nmuons = ak.flatten(eta), ak.num(eta)
+    else:
+        eta_f = eta
+
+    # obtain parameters from correctionlib
+    k_data_f = cset.get("k_data").evaluate(abs(eta_f), var)
+    k_mc_f = cset.get("k_mc").evaluate(abs(eta_f), var)
+
+    # calculate residual smearing factor
+    # return 0 if smearing in MC already larger than in data
+    k_f = np.zeros_like(k_data_f)
+    condition = k_mc_f < k_data_f
+    k_f[condition] = (k_data_f[condition] ** 2 - k_mc_f[condition] ** 2) ** 0.5
+
+    if nested:
+        result = ak.unflatten(k_f, nmuons)
+    else:
+        result = k_f
+
+    return result
+
+
+def reference_pt_resol(pt, eta, nL, cset, rndm):
+    """muon resolution correction with the (awkward) CrystallBall implementation"""
+    rndm = get_rndm(eta, nL, cset, nested=True, rndm=rndm)
+    std = get_std(pt, eta, nL, cset, nested=True)
+    k = get_k(eta, "nom", cset, nested=True)
+    pt_corr = pt * (1 + k * std * rndm)
+    return filter_boundaries(pt_corr, pt, nested=True)
+
+
+def make_muons(nevents: int, seed: int):
+    """random jagged muon pT, eta and number of tracker layers"""
+    rng = np.random.default_rng(seed)
+    counts = rng.poisson(1.5, size=nevents)
+    nmuons = int(counts.sum())
+    pt = ak.unflatten(rng.uniform(27.0, 199.0, size=nmuons), counts)
+    eta = ak.unflatten(rng.uniform(-2.4, 2.4, size=nmuons), counts)
+    nL = ak.unflatten(rng.integers(6, 18, size=nmuons), counts)
+    # uniform numbers, including the Crystal Ball tails
+    rndm = rng.uniform(0.0, 1.0, size=nmuons)
+    ntail = nmuons // 10
+    rndm[:ntail] = rng.uniform(0.0, 0.01, size=ntail)
+    rndm[ntail : 2 * ntail] = rng.uniform(0.99, 1.0, size=ntail)
+    return pt, eta, nL, rndm
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Check the numba muon resolution kernel against the awkward implementation"
+    )
+    parser.add_argument("--year", type=str, default="2022postEE")
+    parser.add_argument("--nevents", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    cset = get_correction_set(
+        str(Path.cwd() / "analysis" / "data" / f"{args.year}_muonSS.json.gz")
+    )
+    pt, eta, nL, rndm = make_muons(args.nevents, args.seed)
+    # compile the kernel before timing it
+    pt_resol(pt[:10], eta[:10], nL[:10], cset, nested=True, rndm=rndm[: ak.sum(ak.num(pt[:10]))])
+
+    start = time.perf_counter()
+    reference = reference_pt_resol(pt, eta, nL, cset, rndm)
+    reference_time = time.perf_counter() - start
+    start = time.perf_counter()
+    kernel = pt_resol(pt, eta, nL, cset, nested=True, rndm=rndm)
+    kernel_time = time.perf_counter() - start
+
+    reference = ak.to_numpy(ak.flatten(reference))
+    kernel = ak.to_numpy(ak.flatten(kernel))
+    relative_diff = np.abs(kernel - reference) / np.abs(reference)
+    print(f"muons: {len(kernel)}")
+    print(f"identical values: {np.mean(kernel == reference):.2%}")
+    print(f"max relative difference: {np.max(relative_diff):.3e}")
+    print(f"awkward: {reference_time:.3f} s, numba kernel: {kernel_time:.3f} s")
+    # numpy's vectorized exp/power may differ from libm in the last bit, which is
+    # amplified in the far Crystal Ball tails (u -> 0 or 1)
+    if not np.allclose(kernel, reference, rtol=1e-8, atol=0.0):
+        raise ValueError("The muon resolution kernel does not match the awkward implementation")
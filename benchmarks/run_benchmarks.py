@@ -0,0 +1,179 @@
+import json
+import time
+import argparse
+import pandas as pd
+from pathlib import Path
+from functools import partial
+from coffea import processor
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from coffea.nanoevents import NanoAODSchema
+from analysis.processors.base import BaseProcessor
+from analysis.corrections.utils import POG_CORRECTION_PATH
+from analysis.utils.profiler import get_max_rss, get_profile_table
+from benchmarks.synthetic_nanoaod import make_synthetic_nanoaod
+
+
+WORKFLOWS = [
+    "ztomumu",
+    "ztoee",
+    "zzto4l",
+    "hww",
+    "zplusl_os",
+    "zplusl_ss",
+    "zplusl_maximal",
+    "zplusll_os",
+    "zplusll_ss",
+]
+# datasets used for the synthetic events (they set the JEC era and dataset-specific weights)
+MC_DATASETS = {"zzto4l": "GluGluHtoZZto4L"}
+DEFAULT_MC_DATASET = "DYto2L_2Jets_50"
+DATA_DATASETS = {"2022preEE": "MuonC", "2022postEE": "MuonE", "2023preBPix": "Muon0v1C", "2023postBPix": "Muon0v1D"}
+
+
+def disable_unavailable_corrections(workflow_config) -> list:
+    """
+    disable the event weights that read correctionlib files from cvmfs when it is not
+    mounted. Returns the names of the disabled weights
+    """
+    if Path(POG_CORRECTION_PATH).exists():
+        return []
+    weights_config = workflow_config.corrections_config["event_weights"]
+    disabled = []
+    if weights_config.get("pileupWeight"):
+        weights_config["pileupWeight"] = False
+        disabled.append("pileupWeight")
+    # lepton weights load the POG scale factors when they are initialized
+    for weight in ["muon", "electron"]:
+        if weight in weights_config:
+            del weights_config[weight]
+            disabled.append(weight)
+    return disabled
+
+
+def run_benchmark(workflow: str, year: str, dataset: str, path: str, chunksize: int) -> dict:
+    """process a synthetic file with a single in-process executor and return its metrics"""
+    processor_instance = BaseProcessor(workflow=workflow, year=year)
+    disabled = disable_unavailable_corrections(processor_instance.workflow_config)
+    start = time.perf_counter()
+    out, metrics = processor.run_uproot_job(
+        {dataset: [path]},
+        treename="Events",
+        processor_instance=processor_instance,
+        executor=processor.iterative_executor,
+        executor_args={"schema": NanoAODSchema, "savemetrics": True},
+        chunksize=chunksize,
+    )
+    wall_time = time.perf_counter() - start
+    return {
+        "workflow": workflow,
+        "dataset": dataset,
+        "chunksize": chunksize,
+        "nevents": metrics["entries"],
+        "wall_time": wall_time,
+        "events/s": metrics["entries"] / wall_time,
+        "max_rss_mb": get_max_rss(),
+        "bytes_read_mb": metrics["bytesread"] / 1e6,
+        "disabled_weights": disabled,
+        "profile": out["metadata"]["profile"],
+    }
+
+
+def main(args):
+    output_dir = Path(args.output_path)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    # generate the synthetic files once (same seed -> same events)
+    samples = {}
+    dataset = DEFAULT_MC_DATASET
+    mc_path = output_dir / f"synthetic_mc_{args.year}_{args.nevents}.root"
+    if not mc_path.exists():
+        make_synthetic_nanoaod(str(mc_path), args.nevents, args.year, is_mc=True, seed=args.seed)
+    samples["mc"] = mc_path
+    if args.data:
+        data_path = output_dir / f"synthetic_data_{args.year}_{args.nevents}.root"
+        if not data_path.exists():
+            make_synthetic_nanoaod(str(data_path), args.nevents, args.year, is_mc=False, seed=args.seed)
+        samples["data"] = data_path
+
+    results = []
+    for workflow in args.workflows:
+        for kind, path in samples.items():
+            if kind == "mc":
+                dataset = MC_DATASETS.get(workflow, DEFAULT_MC_DATASET)
+            else:
+                dataset = DATA_DATASETS[args.year]
+            for chunksize in args.chunksize:
+                # each benchmark runs in a fresh process, so the peak RSS is its own
+                with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+                    result = pool.submit(
+                        partial(run_benchmark, workflow, args.year, dataset, str(path), chunksize)
+                    ).result()
+                results.append(result)
+                print(
+                    f"{workflow} {dataset} chunksize={chunksize}: "
+                    f"{result['events/s']:.0f} events/s, {result['max_rss_mb']:.0f} MB max RSS"
+                )
+                if result["disabled_weights"]:
+                    print(f"  weights disabled (no cvmfs): {result['disabled_weights']}")
+                if args.verbose:
+                    print(get_profile_table(result["profile"]).to_string(float_format="%.3f"))
+
+    summary = pd.DataFrame(
+        [{k: v for k, v in result.items() if k not in ["profile", "disabled_weights"]} for result in results]
+    )
+    print(summary.to_string(index=False, float_format="%.1f"))
+    with open(output_dir / "benchmark_results.json", "w") as f:
+        json.dump(results, f, indent=4, default=float)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-w",
+        "--workflows",
+        nargs="+",
+        default=WORKFLOWS,
+        choices=WORKFLOWS,
+        help="workflows to benchmark (default all)",
+    )
+    parser.add_argument(
+        "-y",
+        "--year",
+        type=str,
+        default="2022postEE",
+        choices=["2022preEE", "2022postEE", "2023preBPix", "2023postBPix"],
+        help="dataset year",
+    )
+    parser.add_argument(
+        "--nevents",
+        type=int,
+        default=100_000,
+        help="number of synthetic events (default 100000)",
+    )
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        nargs="+",
+        default=[10_000, 50_000, 100_000],
+        help="chunk sizes to benchmark",
+    )
+    parser.add_argument(
+        "--data",
+        action="store_true",
+        help="also benchmark a synthetic data sample",
+    )
+    parser.add_argument("--seed", type=int, default=42, help="random seed")
+    parser.add_argument(
+        "--output_path",
+        type=str,
+        default="benchmarks/results",
+        help="directory for the synthetic files and the results json",
+    )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="store_true",
+        help="print the per-stage profile of each benchmark",
+    )
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,421 @@
+import re
+import json
+import yaml
+import uproot
+import argparse
+import numpy as np
+import awkward as ak
+from pathlib import Path
+
+
+Z_MASS = 91.1876
+Z_WIDTH = 2.4952
+MUON_MASS = 0.10566
+ELECTRON_MASS = 0.000511
+# probability of each event topology: Z->mumu, Z->ee, ZZ->4l, no prompt leptons
+TOPOLOGIES = {"zmm": 0.35, "zee": 0.35, "zz": 0.1, "none": 0.2}
+
+
+def get_hlt_paths(year: str) -> list:
+    """return the HLT paths of the year used by the workflows trigger flags"""
+    with open(Path.cwd() / "analysis" / "selections" / "trigger_flags.yaml") as f:
+        trigger_flags = yaml.safe_load(f)[int(year[:4])]
+    return sorted({path for paths in trigger_flags.values() for path in paths})
+
+
+def get_met_filters(year: str) -> list:
+    with open(Path.cwd() / "analysis" / "data" / "metfilters.json") as f:
+        metfilters = json.load(f)[year]
+    return sorted(set(metfilters["mc"]) | set(metfilters["data"]))
+
+
+def get_golden_lumis(year: str) -> np.ndarray:
+    """return the certified (run, luminosityBlock) pairs of the year golden json"""
+    goldenjson = {
+        "2022": "Cert_Collisions2022_355100_362760_Golden.txt",
+        "2023": "Cert_Collisions2023_366442_370790_Golden.txt",
+    }[year[:4]]
+    with open(Path.cwd() / "analysis" / "data" / goldenjson) as f:
+        golden = json.load(f)
+    return np.array(
+        [
+            (int(run), lumi)
+            for run, ranges in golden.items()
+            for start, stop in ranges
+            for lumi in range(start, stop + 1)
+        ],
+        dtype=np.uint32,
+    )
+
+
+def required_leptons(hlt_path: str):
+    """number of muons and electrons required by an HLT path, from its name"""
+    nmuons, nelectrons = 0, 0
+    for token in hlt_path.split("_"):
+        multiplicity = 3 if token.startswith("Triple") else 2 if token.startswith(("Di", "Double")) else 1
+        if re.fullmatch(r"(Iso|Di|Double|Triple)?Mu\d*", token):
+            nmuons += multiplicity
+        if re.fullmatch(r"(Di|Double)?Ele\d*", token):
+            nelectrons += multiplicity
+    return nmuons, nelectrons
+
+
+def decay_z(rng, nz: int, masses: np.ndarray, lepton_mass: float):
+    """
+    return the (pt, eta, phi) of the two leptons of 'nz' Z-like decays with the given
+    masses, boosted from an isotropic decay in the rest frame
+    """
+    pt_z = rng.exponential(15, nz)
+    rapidity = rng.normal(0, 1.5, nz)
+    phi_z = rng.uniform(-np.pi, np.pi, nz)
+    mt = np.sqrt(masses**2 + pt_z**2)
+    z_p4 = np.stack(
+        [
+            mt * np.cosh(rapidity),
+            pt_z * np.cos(phi_z),
+            pt_z * np.sin(phi_z),
+            mt * np.sinh(rapidity),
+        ],
+        axis=1,
+    )
+    # isotropic decay in the Z rest frame
+    p = np.sqrt(np.maximum(masses**2 / 4 - lepton_mass**2, 0))
+    cos_theta = rng.uniform(-1, 1, nz)
+    sin_theta = np.sqrt(1 - cos_theta**2)
+    phi = rng.uniform(-np.pi, np.pi, nz)
+    direction = np.stack([sin_theta * np.cos(phi), sin_theta * np.sin(phi), cos_theta], axis=1)
+    beta = z_p4[:, 1:] / z_p4[:, :1]
+    gamma = 1 / np.sqrt(1 - np.sum(beta**2, axis=1, keepdims=True))
+    leptons = []
+    for sign in [1, -1]:
+        p3 = sign * p[:, None] * direction
+        energy = np.sqrt(p**2 + lepton_mass**2)[:, None]
+        beta_p = np.sum(beta * p3, axis=1, keepdims=True)
+        boosted = p3 + ((gamma - 1) * beta_p / np.sum(beta**2, axis=1, keepdims=True) + gamma * energy) * beta
+        pt = np.hypot(boosted[:, 0], boosted[:, 1])
+        leptons.append(
+            (pt, np.arcsinh(boosted[:, 2] / pt), np.arctan2(boosted[:, 1], boosted[:, 0]))
+        )
+    return leptons
+
+
+def make_leptons(rng, nevents: int, topology: np.ndarray, flavour: int):
+    """
+    build the muons (flavour=13) or electrons (flavour=11) of a batch: prompt leptons
+    from the Z decays of each topology plus a Poisson number of non-prompt leptons
+    """
+    lepton_mass = MUON_MASS if flavour == 13 else ELECTRON_MASS
+    single_z = "zmm" if flavour == 13 else "zee"
+    # one Z for the matching single-Z topology and a random flavour for each ZZ leg
+    z_events = [np.flatnonzero(topology == single_z)]
+    for _ in range(2):
+        zz_events = np.flatnonzero(topology == "zz")
+        z_events.append(zz_events[rng.uniform(size=len(zz_events)) < 0.5])
+    z_events = np.concatenate(z_events)
+    masses = np.clip(Z_MASS + Z_WIDTH / 2 * rng.standard_cauchy(len(z_events)), 12, 500)
+    (pt1, eta1, phi1), (pt2, eta2, phi2) = decay_z(rng, len(z_events), masses, lepton_mass)
+    charge1 = rng.choice([-1, 1], len(z_events))
+    # non-prompt leptons
+    n_nonprompt = rng.poisson(0.3, nevents)
+    nonprompt_events = np.repeat(np.arange(nevents), n_nonprompt)
+    n = len(nonprompt_events)
+    event = np.concatenate([z_events, z_events, nonprompt_events])
+    prompt = np.concatenate([np.ones(2 * len(z_events), dtype=bool), np.zeros(n, dtype=bool)])
+    pt = np.concatenate([pt1, pt2, 5 + rng.exponential(10, n)])
+    eta = np.concatenate([eta1, eta2, rng.uniform(-2.5, 2.5, n)])
+    phi = np.concatenate([phi1, phi2, rng.uniform(-np.pi, np.pi, n)])
+    charge = np.concatenate([charge1, -charge1, rng.choice([-1, 1], n)])
+    # sort by event and decreasing pt, as in NanoAOD
+    order = np.lexsort((-pt, event))
+    event, prompt, pt, eta, phi, charge = (
+        array[order] for array in (event, prompt, pt, eta, phi, charge)
+    )
+    nlep = len(event)
+    good = prompt & (rng.uniform(size=nlep) < 0.95)
+    iso = np.where(prompt, rng.exponential(0.03, nlep), rng.exponential(0.3, nlep))
+    fields = {
+        "pt": pt,
+        "eta": eta,
+        "phi": phi,
+        "mass": np.full(nlep, lepton_mass),
+        "charge": charge,
+        "pdgId": -flavour * charge,
+        "dxy": np.where(prompt, rng.normal(0, 0.005, nlep), rng.normal(0, 0.05, nlep)),
+        "dz": np.where(prompt, rng.normal(0, 0.01, nlep), rng.normal(0, 0.1, nlep)),
+        "sip3d": np.where(prompt, rng.exponential(1.5, nlep), rng.exponential(5, nlep)),
+        "pfRelIso03_all": iso,
+        "pfRelIso04_all": 1.1 * iso,
+        "fsrPhotonIdx": np.full(nlep, -1),
+        "genPartFlav": np.where(prompt, 1, 0),
+    }
+    if flavour == 13:
+        fields.update(
+            {
+                "looseId": good | (rng.uniform(size=nlep) < 0.6),
+                "mediumId": good | (rng.uniform(size=nlep) < 0.4),
+                "tightId": good | (rng.uniform(size=nlep) < 0.3),
+                "isGlobal": good | (rng.uniform(size=nlep) < 0.6),
+                "isTracker": np.ones(nlep, dtype=bool),
+                "isPFcand": np.ones(nlep, dtype=bool),
+                "highPtId": np.where(good, 2, 0),
+                "nTrackerLayers": rng.integers(7, 18, nlep),
+            }
+        )
+    else:
+        fields.update(
+            {
+                "deltaEtaSC": rng.normal(0, 0.01, nlep),
+                "r9": np.clip(rng.normal(0.9, 0.08, nlep), 0, 1.2),
+                "seedGain": rng.choice(np.array([12, 6, 1], dtype=np.uint8), nlep, p=[0.98, 0.015, 0.005]),
+                "mvaIso_WP80": good & (rng.uniform(size=nlep) < 0.85),
+                "mvaIso_WP90": good | (rng.uniform(size=nlep) < 0.1),
+                "mvaNoIso_WP80": good & (rng.uniform(size=nlep) < 0.85),
+                "mvaNoIso_WP90": good | (rng.uniform(size=nlep) < 0.1),
+                "mvaHZZIso": np.where(prompt, rng.normal(0.8, 0.3, nlep), rng.normal(-0.5, 0.5, nlep)),
+                "cutBased": np.where(good, 4, rng.integers(0, 4, nlep)).astype(np.uint8),
+                "lostHits": np.where(good, 0, rng.integers(0, 3, nlep)).astype(np.uint8),
+                "convVeto": good | (rng.uniform(size=nlep) < 0.8),
+            }
+        )
+    counts = np.bincount(event, minlength=nevents)
+    return counts, fields
+
+
+def make_jets(rng, nevents: int, is_mc: bool):
+    counts = rng.poisson(2.5, nevents)
+    njets = counts.sum()
+    pt = 20 + rng.exponential(30, njets)
+    # sort by decreasing pt within each event
+    event = np.repeat(np.arange(nevents), counts)
+    pt = pt[np.lexsort((-pt, event))]
+    fields = {
+        "pt": pt,
+        "eta": np.clip(rng.normal(0, 2, njets), -4.7, 4.7),
+        "phi": rng.uniform(-np.pi, np.pi, njets),
+        "mass": pt * rng.uniform(0.05, 0.2, njets),
+        "rawFactor": rng.uniform(0, 0.2, njets),
+        "area": rng.normal(0.5, 0.02, njets),
+        "jetId": rng.choice(np.array([6, 2, 0], dtype=np.uint8), njets, p=[0.9, 0.05, 0.05]),
+        "nConstituents": rng.integers(2, 40, njets).astype(np.uint8),
+        "neEmEF": rng.uniform(0, 0.5, njets),
+        "chEmEF": rng.uniform(0, 0.5, njets),
+        "muEF": rng.uniform(0, 0.1, njets),
+    }
+    for tagger in ["btagPNet", "btagDeepFlav", "btagRobustParTAK4"]:
+        for discriminant in ["B", "CvL", "CvB"]:
+            fields[f"{tagger}{discriminant}"] = rng.uniform(0, 1, njets)
+    if is_mc:
+        fields["hadronFlavour"] = rng.choice(np.array([0, 4, 5], dtype=np.uint8), njets, p=[0.8, 0.1, 0.1])
+        fields["partonFlavour"] = fields["hadronFlavour"].astype(np.int16)
+        # gen jets are taken as the matched jets (same index) with the reconstructed pt smeared
+        matched = rng.uniform(size=njets) < 0.8
+        local_index = np.arange(njets) - np.repeat(np.cumsum(counts) - counts, counts)
+        fields["genJetIdx"] = np.where(matched, local_index, -1)
+        gen_fields = {
+            "pt": pt * rng.normal(1, 0.1, njets),
+            "eta": fields["eta"],
+            "phi": fields["phi"],
+            "mass": fields["mass"],
+            "hadronFlavour": fields["hadronFlavour"],
+            "partonFlavour": fields["partonFlavour"],
+        }
+        return counts, fields, gen_fields
+    return counts, fields, None
+
+
+def make_trigger_objects(rng, muons, electrons, muon_counts, electron_counts, nevents):
+    """trigger objects matched to 90% of the leptons, with the filter bits used by the matching"""
+    event = np.concatenate(
+        [
+            np.repeat(np.arange(nevents), muon_counts),
+            np.repeat(np.arange(nevents), electron_counts),
+        ]
+    )
+    nlep = len(event)
+    keep = rng.uniform(size=nlep) < 0.9
+    order = np.argsort(event[keep], kind="stable")
+    fields = {
+        "pt": np.concatenate([muons["pt"], electrons["pt"]]) * rng.normal(1, 0.02, nlep),
+        "eta": np.concatenate([muons["eta"], electrons["eta"]]),
+        "phi": np.concatenate([muons["phi"], electrons["phi"]]),
+        "id": np.concatenate([np.full(len(muons["pt"]), 13), np.full(len(electrons["pt"]), 11)]),
+        # muons: bit 0 (TrkIsoVVL) and bit 3 (1mu); electrons: bit 1 (WPTight)
+        "filterBits": np.concatenate(
+            [np.full(len(muons["pt"]), 0b1001), np.full(len(electrons["pt"]), 0b10)]
+        ),
+    }
+    fields = {name: values[keep][order] for name, values in fields.items()}
+    return np.bincount(event[keep], minlength=nevents), fields
+
+
+def make_gen_leptons(nevents: int, *leptons):
+    """generator-level copies of the prompt leptons (coffea uses GenPart to tell MC from data)"""
+    event = np.concatenate(
+        [np.repeat(np.arange(nevents), counts) for counts, _ in leptons]
+    )
+    prompt = np.concatenate([fields["genPartFlav"] == 1 for _, fields in leptons])
+    order = np.argsort(event[prompt], kind="stable")
+    fields = {
+        name: np.concatenate([lepton_fields[name] for _, lepton_fields in leptons])[prompt][order]
+        for name in ["pt", "eta", "phi", "mass", "pdgId"]
+    }
+    ngen = len(order)
+    fields["status"] = np.ones(ngen, dtype=np.int32)
+    fields["statusFlags"] = np.full(ngen, 0b1, dtype=np.int32)
+    fields["genPartIdxMother"] = np.full(ngen, -1, dtype=np.int32)
+    return np.bincount(event[prompt], minlength=nevents), fields
+
+
+def make_batch(rng, nevents: int, year: str, is_mc: bool, golden_lumis=None, first_event=0) -> dict:
+    """return a {branch: array} dictionary with a batch of synthetic NanoAOD events"""
+    topology = rng.choice(list(TOPOLOGIES), nevents, p=list(TOPOLOGIES.values()))
+    muon_counts, muons = make_leptons(rng, nevents, topology, flavour=13)
+    electron_counts, electrons = make_leptons(rng, nevents, topology, flavour=11)
+    jet_counts, jets, genjets = make_jets(rng, nevents, is_mc)
+    trigobj_counts, trigobjs = make_trigger_objects(
+        rng, muons, electrons, muon_counts, electron_counts, nevents
+    )
+    nphotons = rng.poisson(0.2, nevents)
+    nfsr = nphotons.sum()
+    fsr_photons = {
+        "pt": 2 + rng.exponential(5, nfsr),
+        "eta": rng.uniform(-2.5, 2.5, nfsr),
+        "phi": rng.uniform(-np.pi, np.pi, nfsr),
+        "dROverEt2": rng.uniform(0, 0.02, nfsr),
+        "relIso03": rng.exponential(0.5, nfsr),
+        "muonIdx": np.full(nfsr, -1),
+        "electronIdx": np.full(nfsr, -1),
+    }
+    collections = {
+        "Muon": (muon_counts, muons),
+        "Electron": (electron_counts, electrons),
+        "Jet": (jet_counts, jets),
+        "FsrPhoton": (nphotons, fsr_photons),
+        "TrigObj": (trigobj_counts, trigobjs),
+    }
+    if is_mc:
+        collections["GenJet"] = (jet_counts, genjets)
+        collections["GenPart"] = make_gen_leptons(
+            nevents, (muon_counts, muons), (electron_counts, electrons)
+        )
+
+    branches = {}
+    for name, (counts, fields) in collections.items():
+        branches[name] = ak.zip(
+            {
+                field: ak.unflatten(
+                    values.astype(np.float32) if values.dtype == np.float64 else values,
+                    counts,
+                )
+                for field, values in fields.items()
+            }
+        )
+    # event information
+    if is_mc:
+        branches["run"] = np.ones(nevents, dtype=np.uint32)
+        branches["luminosityBlock"] = rng.integers(1, 1000, nevents).astype(np.uint32)
+    else:
+        run_lumis = golden_lumis[rng.integers(0, len(golden_lumis), nevents)]
+        branches["run"] = run_lumis[:, 0]
+        branches["luminosityBlock"] = run_lumis[:, 1]
+    branches["event"] = np.arange(first_event, first_event + nevents, dtype=np.uint64)
+    # triggers fire for events with the leptons required by the path (95% efficiency)
+    for hlt_path in get_hlt_paths(year):
+        nmuons, nelectrons = required_leptons(hlt_path)
+        fired = (muon_counts >= nmuons) & (electron_counts >= nelectrons)
+        branches[f"HLT_{hlt_path}"] = (fired & (rng.uniform(size=nevents) < 0.95)) | (
+            rng.uniform(size=nevents) < 0.01
+        )
+    for metfilter in get_met_filters(year):
+        branches[f"Flag_{metfilter}"] = rng.uniform(size=nevents) < 0.99
+    branches["PV_npvs"] = (rng.poisson(30, nevents) + 1).astype(np.uint8)
+    branches["PV_npvsGood"] = np.minimum(branches["PV_npvs"], rng.poisson(28, nevents) + 1).astype(np.uint8)
+    branches["Rho_fixedGridRhoFastjetAll"] = np.clip(rng.normal(20, 5, nevents), 0, None).astype(np.float32)
+    met_pt = rng.exponential(30, nevents).astype(np.float32)
+    met_phi = rng.uniform(-np.pi, np.pi, nevents).astype(np.float32)
+    branches["PuppiMET_pt"] = met_pt
+    branches["PuppiMET_phi"] = met_phi
+    branches["PuppiMET_sumEt"] = (met_pt + rng.exponential(500, nevents)).astype(np.float32)
+    for shift, factor in [("Up", 1.02), ("Down", 0.98)]:
+        branches[f"PuppiMET_ptUnclustered{shift}"] = met_pt * np.float32(factor)
+        branches[f"PuppiMET_phiUnclustered{shift}"] = met_phi
+    if is_mc:
+        branches["genWeight"] = np.where(rng.uniform(size=nevents) < 0.1, -1.0, 1.0).astype(np.float32)
+        branches["Pileup_nTrueInt"] = np.clip(rng.normal(30, 8, nevents), 0, 98).astype(np.float32)
+        branches["Pileup_nPU"] = rng.poisson(branches["Pileup_nTrueInt"]).astype(np.int32)
+        for name, nweights, spread in [
+            ("LHEScaleWeight", 9, 0.1),
+            ("LHEPdfWeight", 103, 0.02),
+            ("PSWeight", 4, 0.05),
+        ]:
+            branches[name] = ak.unflatten(
+                rng.normal(1, spread, nevents * nweights).astype(np.float32),
+                np.full(nevents, nweights),
+            )
+        branches["LHE_HT"] = ak.to_numpy(ak.sum(branches["Jet"].pt, axis=1)).astype(np.float32)
+        branches["HTXS_Higgs_pt"] = rng.exponential(40, nevents).astype(np.float32)
+        branches["HTXS_njets30"] = rng.poisson(1, nevents).astype(np.uint8)
+    return branches
+
+
+def make_synthetic_nanoaod(
+    path: str,
+    nevents: int,
+    year: str = "2022postEE",
+    is_mc: bool = True,
+    seed: int = 42,
+    batch_size: int = 50_000,
+) -> str:
+    """
+    write a ROOT file with 'nevents' synthetic NanoAOD events
+
+    Parameters:
+    -----------
+        path:
+            output ROOT file path
+        nevents:
+            number of events
+        year:
+            dataset year {2022preEE, 2022postEE, 2023preBPix, 2023postBPix}. Sets the
+            HLT paths, MET filters and (for data) the certified runs and lumi sections
+        is_mc:
+            whether to write the MC-only branches (genWeight, Pileup, LHE, GenJet, ...)
+        seed:
+            random seed. The same arguments always produce the same events
+        batch_size:
+            number of events generated and written at once (one basket per batch)
+    """
+    rng = np.random.default_rng(seed)
+    golden_lumis = None if is_mc else get_golden_lumis(year)
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with uproot.recreate(path) as f:
+        for first_event in range(0, nevents, batch_size):
+            batch = make_batch(
+                rng,
+                min(batch_size, nevents - first_event),
+                year,
+                is_mc,
+                golden_lumis,
+                first_event,
+            )
+            if first_event == 0:
+                f["Events"] = batch
+            else:
+                f["Events"].extend(batch)
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--output", type=str, default="benchmarks/data/synthetic_mc.root")
+    parser.add_argument("--nevents", type=int, default=100_000)
+    parser.add_argument(
+        "--year",
+        type=str,
+        default="2022postEE",
+        choices=["2022preEE", "2022postEE", "2023preBPix", "2023postBPix"],
+    )
+    parser.add_argument("--data", action="store_true", help="generate data-like events")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    make_synthetic_nanoaod(args.output, args.nevents, args.year, not args.data, args.seed)
@@ -27,6 +27,24 @@ OPTS="--workflow ${ARGS[workflow]} --year ${ARGS[year]} --output_path ${ARGS[out
 python3 -c "import json; json.dump(json.load(open('$WORKDIR/partitions.json'))['$JOBID'], open('$WORKDIR/partition_fileset.json', 'w'), indent=4)"
 OPTS="$OPTS --partition_json $WORKDIR/partition_fileset.json"
 
+# set memory budget if given
+MAXMEMORY=$(python3 -c "import json; print(json.load(open('$WORKDIR/arguments.json')).get('max_memory') or '')")
+if [ -n "$MAXMEMORY" ]; then
+    OPTS="$OPTS --max_memory $MAXMEMORY"
+fi
+
+# only compute nominal weights (quick-look mode)
+NOMINALONLY=$(python3 -c "import json; print(json.load(open('$WORKDIR/arguments.json')).get('nominal_only', False))")
+if [ "$NOMINALONLY" == "True" ]; then
+    OPTS="$OPTS --nominal_only"
+fi
+
+# fail if a branch outside the columns manifest is read
+STRICTCOLUMNS=$(python3 -c "import json; print(json.load(open('$WORKDIR/arguments.json')).get('strict_columns', False))")
+if [ "$STRICTCOLUMNS" == "True" ]; then
+    OPTS="$OPTS --strict_columns"
+fi
+
 echo $OPTS
 
 cd $BASEDIR
@@ -7,7 +7,7 @@ import logging
 import subprocess
 from pathlib import Path
 from datetime import datetime, timedelta
-from analysis.utils import make_output_directory
+from analysis.utils import make_output_directory, get_profile_table
 from analysis.filesets.xrootd_sites import xroot_to_site
 from analysis.filesets.utils import divide_list, modify_site_list, extract_xrootd_errors
 
@@ -50,6 +50,11 @@ def parse_args():
         choices=["coffea", "root"],
         help="Format of output histograms",
     )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="print the per-stage processing profile of each dataset",
+    )
     parser.add_argument(
         "--hours_ago",
         type=int,
@@ -252,6 +257,36 @@ def resubmit_jobs(job_dir, jobnum_missing, datasets_with_missing_jobs, workflow,
         subprocess.run(["condor_submit", submit_file])
 
 
+def print_profile(output_dir, jobnum_done, output_format):
+    """
+    Print the per-stage processing profile (wall/CPU time, events in/out, events/s) of each dataset.
+
+    Parameters:
+    -----------
+        output_dir (Path): Directory with output files.
+        jobnum_done (dict): Completed job numbers per dataset.
+        output_format (str): File format of the output (e.g., 'coffea' or 'root').
+    """
+    import pickle
+    from coffea.util import load
+    from coffea.processor import accumulate
+
+    metadata_extension = "coffea" if output_format == "coffea" else "pkl"
+    for dataset in jobnum_done:
+        profiles = []
+        for output_file in (output_dir / dataset).glob(f"*.{metadata_extension}"):
+            if output_format == "coffea":
+                metadata = load(output_file)["metadata"]
+            else:
+                with open(output_file, "rb") as f:
+                    metadata = pickle.load(f)
+            if "profile" in metadata:
+                profiles.append(metadata["profile"])
+        if profiles:
+            logging.info(f"Profile for {dataset}:")
+            logging.info(f"{get_profile_table(accumulate(profiles))}\n")
+
+
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO, format="%(message)s")
     args = parse_args()
@@ -271,6 +306,9 @@ if __name__ == "__main__":
 
     jobnum_missing, datasets_with_missing_jobs = print_job_status(jobnum, jobnum_done)
 
+    if args.profile:
+        print_profile(output_dir, jobnum_done, args.output_format)
+
     if jobnum_missing and datasets_with_missing_jobs:
         site_errs = analyze_xrootd_errors(error_file)
 
@@ -10,6 +10,7 @@ from pathlib import Path
 from collections import defaultdict
 from coffea.util import load
 from coffea.processor import accumulate
+from analysis.histograms import get_histogram_templates
 from analysis.workflows.config import WorkflowConfigBuilder
 from analysis.postprocess.coffea_plotter import CoffeaPlotter
 from analysis.postprocess.utils import (
@@ -19,6 +20,7 @@ from analysis.postprocess.utils import (
     df_to_latex,
     combine_event_tables,
     combine_cutflows,
+    label_preselection_cuts,
     format_cutflow_with_efficiency,
 )
 from analysis.postprocess.coffea_postprocessor import (
@@ -180,6 +182,9 @@ def save_cutflow_report(
 
     cutflow_index = ["initial"] + event_selection["categories"][category]
     cutflow_df = cutflow_df.loc[cutflow_index]
+    cutflow_df = label_preselection_cuts(
+        cutflow_df, event_selection.get("preselection", [])
+    )
 
     ordered_cols = ["Data", "Total Background"] + [
         col for col in cutflow_df.columns if col not in ["Data", "Total Background"]
@@ -332,6 +337,8 @@ if __name__ == "__main__":
         process_samples_map = build_process_sample_map(
             grouped_outputs.keys(), args.year
         )
+        # axes of the workflow histograms, used to build the missing histograms
+        histogram_templates = get_histogram_templates(workflow_config)
 
         for sample in grouped_outputs:
             save_process_histograms_by_sample(
@@ -340,6 +347,7 @@ if __name__ == "__main__":
                 sample=sample,
                 grouped_outputs=grouped_outputs,
                 categories=categories,
+                histogram_templates=histogram_templates,
             )
             gc.collect()
 
@@ -181,6 +181,22 @@ if __name__ == "__main__":
         choices=["coffea", "root"],
         help="format of output histogram",
     )
+    parser.add_argument(
+        "--max_memory",
+        type=float,
+        default=None,
+        help="memory budget of each job in MB (default None)",
+    )
+    parser.add_argument(
+        "--nominal_only",
+        action="store_true",
+        help="only compute nominal weights and fill the 'nominal' variation (quick-look mode)",
+    )
+    parser.add_argument(
+        "--strict_columns",
+        action="store_true",
+        help="fail the jobs that read a branch outside the workflow columns manifest",
+    )
     args = parser.parse_args()
 
     # check if the fileset for the given year exists, generate it otherwise
@@ -218,4 +234,10 @@ if __name__ == "__main__":
             cmd_args.append("--submit")
         if args.eos:
             cmd_args.append("--eos")
+        if args.max_memory:
+            cmd_args += ["--max_memory", str(args.max_memory)]
+        if args.nominal_only:
+            cmd_args.append("--nominal_only")
+        if args.strict_columns:
+            cmd_args.append("--strict_columns")
         subprocess.run(cmd + cmd_args)
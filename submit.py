@@ -3,22 +3,91 @@ import argparse
 from coffea import processor
 from coffea.util import save
 from coffea.nanoevents import NanoAODSchema
-from analysis.utils import write_root
+from analysis.utils import write_root, MemoryBudgetExceeded
 from analysis.processors.base import BaseProcessor
+from analysis.histograms import compact_histograms, WORKERS
+from analysis.workflows.config.columns import (
+    get_columns_manifest,
+    get_unexpected_columns,
+)
+
+# smallest chunksize tried before giving up on the memory budget
+MIN_CHUNKSIZE = 1000
+
+
+def is_memory_budget_error(error) -> bool:
+    """check if an exception (or any exception it was raised from) is a MemoryBudgetExceeded"""
+    while error is not None:
+        if isinstance(error, MemoryBudgetExceeded):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
 
 
 def main(args):
     with open(args.partition_json) as f:
         partition_fileset = json.load(f)
-    out = processor.run_uproot_job(
-        partition_fileset,
-        treename="Events",
-        processor_instance=BaseProcessor(workflow=args.workflow, year=args.year),
-        executor=processor.futures_executor,
-        executor_args={"schema": NanoAODSchema, "workers": 4},
+    # the memory budget is shared by the worker processes
+    max_memory = args.max_memory / WORKERS if args.max_memory else None
+    processor_instance = BaseProcessor(
+        workflow=args.workflow,
+        year=args.year,
+        max_memory=max_memory,
+        nominal_only=args.nominal_only,
+    )
+    chunksize = args.chunksize
+    while True:
+        try:
+            out, metrics = processor.run_uproot_job(
+                partition_fileset,
+                treename="Events",
+                processor_instance=processor_instance,
+                executor=processor.futures_executor,
+                executor_args={
+                    "schema": NanoAODSchema,
+                    "workers": WORKERS,
+                    "savemetrics": True,
+                },
+                chunksize=chunksize,
+            )
+            # chunks that exceeded the memory budget return the error in their metadata
+            exceeded = out["metadata"].get("memory_budget_exceeded")
+            if exceeded:
+                raise MemoryBudgetExceeded(exceeded[0])
+            break
+        except Exception as error:
+            if not is_memory_budget_error(error):
+                raise
+            # retry with smaller chunks until they fit in the memory budget
+            if chunksize // 2 < MIN_CHUNKSIZE:
+                raise RuntimeError(
+                    f"Memory budget of {args.max_memory} MB ({max_memory:.0f} MB per worker) "
+                    f"exceeded with chunksize {chunksize}, the minimum allowed is {MIN_CHUNKSIZE}"
+                ) from error
+            chunksize //= 2
+            print(f"Memory budget exceeded: {error}")
+            print(f"Retrying with chunksize {chunksize}")
+    # check that only the columns expected by the workflow were read
+    manifest = get_columns_manifest(processor_instance.workflow_config)
+    unexpected_columns = get_unexpected_columns(metrics["columns"], manifest)
+    if unexpected_columns:
+        message = f"Branches read outside the '{args.workflow}' columns manifest: {unexpected_columns}"
+        if args.strict_columns:
+            raise ValueError(message)
+        print(f"Warning: {message}")
+    # save the branches read and the bytes read from the input files (as counted by
+    # uproot while processing the chunks) to metadata
+    out["metadata"]["columns_read"] = set(metrics["columns"])
+    out["metadata"]["bytes_read"] = metrics.get("bytesread", 0)
+    print(
+        f"Read {len(metrics['columns'])} branches, {metrics.get('bytesread', 0) / 1e6:.1f} MB"
     )
     savepath = f"{args.output_path}/{args.dataset}"
     if args.output_format == "coffea":
+        # save histograms with the output precision of the workflow
+        out["histograms"] = compact_histograms(
+            out["histograms"], processor_instance.histogram_config
+        )
         save(out, f"{savepath}.coffea")
     elif args.output_format == "root":
         write_root(out, savepath, args)
@@ -78,5 +147,27 @@ if __name__ == "__main__":
         choices=["coffea", "root"],
         help="format of output histogram",
     )
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        default=100000,
+        help="number of events per chunk (default 100000)",
+    )
+    parser.add_argument(
+        "--max_memory",
+        type=float,
+        default=None,
+        help="memory budget in MB shared by all workers. Chunks are halved while it is exceeded",
+    )
+    parser.add_argument(
+        "--nominal_only",
+        action="store_true",
+        help="only compute nominal weights and fill the 'nominal' variation (quick-look mode)",
+    )
+    parser.add_argument(
+        "--strict_columns",
+        action="store_true",
+        help="fail if a branch outside the workflow columns manifest is read",
+    )
     args = parser.parse_args()
     main(args)
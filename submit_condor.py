@@ -3,8 +3,11 @@ import json
 import argparse
 import subprocess
 from pathlib import Path
+from analysis.histograms import HistBuilder, HISTOGRAM_COPIES
 from analysis.filesets.utils import divide_list
 from analysis.utils import make_output_directory
+from analysis.workflows.config import WorkflowConfigBuilder
+from analysis.corrections.jerc import build_jec_artifact, check_jec_artifact
 
 
 def move_proxy() -> str:
@@ -26,9 +29,38 @@ def move_proxy() -> str:
     return x509_path
 
 
+def check_histograms_memory(args):
+    """print the histograms memory estimate and check it against the memory budget"""
+    workflow_config = WorkflowConfigBuilder(workflow=args.workflow).build_workflow_config()
+    if args.nominal_only:
+        workflow_config.histogram_config.variations = ["nominal"]
+    hist_builder = HistBuilder(workflow_config)
+    for hist_name, info in hist_builder.estimate_memory().items():
+        print(
+            f"  {hist_name}: {info['bins']} bins, {info['bytes'] / 1e6:.1f} MB ({info['storage']})"
+        )
+    histograms_mb = hist_builder.check_memory_budget(
+        max_memory=args.max_memory, copies=HISTOGRAM_COPIES
+    )
+    print(f"Histograms memory per job ({HISTOGRAM_COPIES} copies): {histograms_mb:.1f} MB")
+
+
+def update_jec_artifact(args):
+    """convert the JEC/JER text files of the year if their artifact is missing or stale"""
+    workflow_config = WorkflowConfigBuilder(workflow=args.workflow).build_workflow_config()
+    if "jets" not in workflow_config.corrections_config["objects"]:
+        return
+    if not check_jec_artifact(args.year):
+        print(f"Saving JEC/JER artifact to {build_jec_artifact(args.year)}")
+
+
 def submit_condor(args):
     """Build condor files. Optionally submit condor job"""
     print(f"Creating {args.workflow}-{args.year}-{args.dataset} condor file")
+    # fail before building the jobs if the histograms do not fit in the job memory
+    check_histograms_memory(args)
+    # jobs read the JEC/JER lookup tables from the artifact instead of the text files
+    update_jec_artifact(args)
     jobname = f"{args.workflow}_{args.dataset}"
 
     # make condor and log directories
@@ -155,5 +187,21 @@ if __name__ == "__main__":
         choices=["coffea", "root"],
         help="format of output histogram",
     )
+    parser.add_argument(
+        "--max_memory",
+        type=float,
+        default=None,
+        help="memory budget of each job in MB (default None)",
+    )
+    parser.add_argument(
+        "--nominal_only",
+        action="store_true",
+        help="only compute nominal weights and fill the 'nominal' variation (quick-look mode)",
+    )
+    parser.add_argument(
+        "--strict_columns",
+        action="store_true",
+        help="fail the jobs that read a branch outside the workflow columns manifest",
+    )
     args = parser.parse_args()
     submit_condor(args)